@@ -2,11 +2,47 @@
 # Requirements: flask, requests
 # Run: pip install flask requests
 
-from flask import Flask, render_template_string, request, session, redirect, jsonify
+import os
+
+# Async serving mode (CHOYROKU_SERVER=async, needs gevent): sockets, sleeps, locks, queues and threads all become
+# cooperative, so a request waiting on a slow Roku parks cheaply instead of holding a worker. This has to happen
+# before anything below imports socket or threading.
+ASYNC_MODE = os.environ.get("CHOYROKU_SERVER") == "async"
+if ASYNC_MODE:
+    from gevent import monkey
+    monkey.patch_all()
+
+from flask import Flask, request, session, redirect, jsonify, Response
 import requests
 import socket
+import http.client
+import json
+import contextlib
+import math
+import gzip
+import hashlib
+import heapq
+import itertools
+import queue
 import re
+import time
+import threading
 import logging
+import xml.etree.ElementTree as ET
+from urllib.parse import quote, urlencode
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl  # Used to elect one scheduler process among gunicorn workers; absent on Windows
+except ImportError:
+    fcntl = None
+
+try:
+    from flask_sock import Sock  # Optional: WebSocket control channel (pip install flask-sock)
+except ImportError:
+    Sock = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -14,8 +50,10 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = "change_this_to_something_secure"
+sock = Sock(app) if Sock else None
 
 # Define manual Roku IPs - Update these with your actual Roku IP addresses
+# These (and DEVICE_GROUPS) only seed the device registry when DEVICES_FILE does not exist
 ROKU1_IP = "192.168.1.129"
 ROKU2_IP = "192.168.1.8"
 
@@ -23,56 +61,224 @@ ROKU2_IP = "192.168.1.8"
 FLASK_HOST = "0.0.0.0"  # Listen on all interfaces
 FLASK_PORT = 8000
 
+DISCOVERY_CACHE_TTL = 120  # Seconds a discovery result is reused before it is refreshed in the background
+
+# Device registry configuration
+DEVICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
+DEVICE_DISCOVERY = True    # Add devices found via SSDP to the registry; turn off for a fleet fully listed in DEVICES_FILE
+DEVICE_PAGE_SIZE = 25      # Devices per page in the UI and API
+DEVICE_PAGE_MAX = 200      # Largest page a client may ask for
+
+# Response caching and compression
+GZIP_MIN_BYTES = 512  # Smaller bodies are not worth compressing
+GZIP_MIMETYPES = {"text/html", "text/css", "application/javascript", "application/json",
+                  "application/manifest+json", "image/svg+xml"}
+GZIP_CACHE_ENTRIES = 32  # Compressed bodies kept by ETag, so unchanged pages and assets are compressed once
+
+# Installable app (web app manifest and service worker)
+APP_NAME = "ChoyRoku"
+APP_THEME_COLOR = "#007bff"
+SW_ICON_CACHE_ENTRIES = 100  # App icons the service worker keeps for offline start-up
+
+# Wake-then-act configuration (TV-class Rokus in standby)
+WAKE_TIMEOUT = 20          # Seconds to wait for a device to report PowerOn
+WAKE_POLL_INITIAL = 0.25   # First readiness poll delay in seconds, doubled each attempt
+WAKE_POLL_MAX = 2.0        # Upper bound for the readiness poll delay
+
+# Macro configuration
+MACROS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "macros.json")
+MACRO_STEP_GAP_MS = 150    # Default spacing between macro steps so the Roku UI can keep up
+MACRO_MAX_DELAY_MS = 60000 # Longest delay or gap in one step, so a macro cannot tie up a worker indefinitely
+
+# JSON API v2 batch configuration
+BATCH_MAX_COMMANDS = 100   # Commands accepted in one batch request
+BATCH_KEY_PACE_MS = 150    # Default spacing of consecutive key commands, which are pipelined on one connection
+BATCH_MAX_DELAY_MS = 10000 # Longest single delay command, so a batch cannot tie up a worker indefinitely
+BATCH_MAX_PACE_MS = 2000   # Upper bound for a batch's pace_ms; larger values are clamped to it
+
+# Text entry configuration
+TEXT_INPUT_PACE_MS = 15    # Spacing between pipelined Lit_ keypresses; raise if a channel drops characters
+TEXT_INPUT_MAX_CHARS = 200
+KEYBOARD_PACE_MS = 80      # Spacing between cursor moves on on-screen keyboards, which animate each move
+
+# On-screen keyboard grids for channels that ignore Lit_ input. Each row is a string (or a list when a
+# cell needs a multi-character name); " " is the space key and None marks a gap the cursor cannot enter.
+# "start" is where the cursor sits when the keyboard opens, "wrap" whether moving off an edge wraps around.
+KEYBOARD_LAYOUTS = {
+    "roku": {
+        "rows": ["abcdefg", "hijklmn", "opqrstu", "vwxyz12", "3456789", ["0", " ", None, None, None, None, None]],
+        "start": (0, 0),
+        "wrap": True,
+    },
+    "youtube": {
+        "rows": ["abcdefg", "hijklmn", "opqrstu", "vwxyz-'", ["1", "2", "3", "4", "5", "6", "7"],
+                 ["8", "9", "0", " ", " ", " ", " "]],
+        "start": (0, 0),
+        "wrap": False,
+    },
+    "netflix": {
+        "rows": [[" ", " ", " "] + [None] * 3, "abcdef", "ghijkl", "mnopqr", "stuvwx", "yz1234", "567890"],
+        "start": (1, 0),
+        "wrap": False,
+    },
+}
+
+# Press-and-hold configuration
+HOLD_REPEAT_KEYS = {"VolumeUp", "VolumeDown"}  # Repeated server-side rather than sent as keydown/keyup
+HOLD_REPEAT_RATE = 8       # Presses per second while a HOLD_REPEAT_KEYS key is held
+HOLD_SAFETY_TIMEOUT = 2.0  # Release a held key if the client has not renewed the hold for this long
+HOLD_MAX_SECONDS = 30      # Hard limit on any single hold
+
+# Duplicate-tap suppression for /send, /launch and the WebSocket channel (per client, device and key)
+DEBOUNCE_WINDOW_MS = 300   # Identical presses of a non-repeatable key (OK, Play, launches...) this close are dropped
+DEBOUNCE_REPEAT_WINDOW_MS = 40  # Repeatable keys only lose ghost double-fires this close together
+DEBOUNCE_KEY_WINDOWS_MS = {}    # Per-key overrides, e.g. {"Select": 500}; 0 turns suppression off for a key
+REPEATABLE_KEYS = {"Up", "Down", "Left", "Right", "VolumeUp", "VolumeDown", "Rev", "Fwd", "Backspace",
+                   "ChannelUp", "ChannelDown"}
+DEBOUNCE_FOLD_REPEATS = True    # Repeatable presses arriving while the same key is in flight become one paced burst
+DEBOUNCE_FOLD_PACE_MS = 60      # Spacing of the presses in a folded burst
+DEBOUNCE_INFLIGHT_MAX = 5.0     # A press in flight longer than this no longer absorbs later ones
+
+# Seek configuration
+SEEK_TOLERANCE = 5         # Seconds from the target that counts as landed
+SEEK_MAX_ROUNDS = 6        # Correction rounds before giving up
+SEEK_POLL_INTERVAL = 0.4   # Position polling interval while fast-forwarding or rewinding
+SEEK_REPLAY_RANGE = 25     # Backward jumps up to this many seconds use InstantReplay instead of Rev
+SEEK_SPEED_STEPS = [(120, 1), (600, 2), (float("inf"), 3)]  # (distance up to, Fwd/Rev presses)
+SEEK_TIME_BUDGET = 8       # Seconds a seek may take in total before giving up where it is
+SEEK_STALL_POLLS = 2       # Polls in a row without trick-play progress before the channel counts as ignoring it
+SEEK_MIN_SPEED = 1.5       # Progress toward the target, in seconds per second, that counts as trick play
+
+# Active-app cache (lets launch skip relaunching the channel that is already in the foreground)
+ACTIVE_APP_REFRESH = 5     # Seconds between background /query/active-app refreshes when nobody is watching
+ACTIVE_APP_MAX_AGE = 10    # Cached values older than this are not trusted to skip a launch
+ACTIVE_APP_IDLE_STOP = 600 # Stop refreshing a device that has not been used for this long
+APP_CHANGING_KEYS = {"Home", "Back", "Power", "PowerOff", "PowerOn"}  # Keys that may leave the current app
+LAUNCH_PARAMS = ("contentId", "mediaType")  # Deep-link parameters accepted by /launch
+
+# Now-playing state engine: one adaptive poll loop per device, pushed to every watching browser
+NOW_PLAYING_FAST = 1.0     # Poll interval while media is playing and a browser is watching
+NOW_PLAYING_WATCHED = 2.0  # Poll interval while a browser is watching and nothing is playing
+NOW_PLAYING_IDLE_MAX = 10  # Unchanged watched devices back off up to this interval
+NOW_PLAYING_SETTLE = 0.3   # After a command, wait this long for the device to change state, then poll
+NOW_PLAYING_HEARTBEAT = 15 # Seconds between keep-alive comments on idle event streams
+
+# Capability flags from /query/device-info decide which keys a device can act on
+KEY_CAPABILITIES = {
+    "VolumeUp": "has_volume", "VolumeDown": "has_volume", "VolumeMute": "has_volume",
+    "Power": "has_power", "PowerOff": "has_power", "PowerOn": "has_power",
+    "FindRemote": "supports_find_remote",
+    "ChannelUp": "is_tv", "ChannelDown": "is_tv", "InputTuner": "is_tv", "InputAV1": "is_tv",
+    "InputHDMI1": "is_tv", "InputHDMI2": "is_tv", "InputHDMI3": "is_tv", "InputHDMI4": "is_tv",
+}
+CAPABILITY_OVERRIDES = {
+    # Per-device corrections, e.g. a streambar that does have volume control:
+    # "192.168.1.8": {"has_volume": True},
+}
+PROBE_RETRY_AFTER = 30     # Seconds an unreachable device is not asked again for capabilities or its first app list
+
+# App catalog configuration
+APP_CATALOG_TTL = 300      # Seconds before a device's /query/apps list is revalidated in the background
+ICON_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icon_cache")
+ICON_CACHE_MEMORY_BYTES = 4 * 1024 * 1024   # In-memory LRU budget for app icons
+ICON_CACHE_DISK_BYTES = 32 * 1024 * 1024    # On-disk LRU budget for app icons
+ICON_MAX_AGE = 30 * 24 * 3600               # Browser cache lifetime for versioned icon URLs
+DEFAULT_APPS = [{"id": "837", "name": "YouTube"}, {"id": "12", "name": "Netflix"}]  # Until a catalog is known
+
+# Scheduler configuration
+SCHEDULER_ENABLED = True
+SCHEDULE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule.json")
+SCHEDULE_MISSED_GRACE = 3600  # Runs missed while the server was down are made up only if this recent (seconds)
+SCHEDULE_RELOAD_CHECK = 60    # Longest the scheduler sleeps before checking for edits by other worker processes
+SCHEDULE_MAX_WORKERS = 4      # Scheduled entries running at once; each fans out through the broadcast pool
+
+# Broadcast configuration
+BROADCAST_MAX_WORKERS = 16  # Maximum number of devices contacted at once
+SYNC_LEAD_MS = 150         # Default time allowed to pre-open connections before a synchronized release
+SYNC_MAX_LEAD_MS = 5000    # Longest lead_ms a request may ask for
+SYNC_SPIN_MS = 2           # The last stretch before a synchronized release is busy-waited (not in async mode)
+DEVICE_GROUPS = {
+    # Named sets of Roku IPs that can be targeted together (seed only; see DEVICES_FILE), e.g.
+    # "lobby": ["192.168.1.129", "192.168.1.8"],
+}
+
+STYLE = '''
+body { font-family: Arial, sans-serif; margin: 20px; }
+.device-select { margin: 20px 0; }
+.control-grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 10px; margin: 20px 0; }
+button { padding: 15px; font-size: 16px; border: none; border-radius: 5px; cursor: pointer; }
+.nav-btn { background: #007bff; color: white; }
+.media-btn { background: #28a745; color: white; }
+.volume-btn { background: #ffc107; color: black; }
+.app-btn { background: #dc3545; color: white; }
+.macro-btn { background: #6f42c1; color: white; }
+.power-btn { background: #343a40; color: white; }
+.app-icon { display: block; width: 100%; max-width: 120px; margin: 0 auto 5px; border-radius: 3px; }
+.status { margin: 10px 0; padding: 10px; border-radius: 5px; }
+.success { background: #d4edda; color: #155724; }
+.error { background: #f8d7da; color: #721c24; }
+.error-text { color: #721c24; }
+.link-btn { padding: 0; background: none; color: #007bff; font-size: 14px; text-decoration: underline; }
+select { padding: 10px; font-size: 16px; margin-right: 10px; }
+.device-filter input, .device-filter select { padding: 8px; font-size: 14px; margin: 0 5px 10px 0; }
+.device-pager { margin-top: 8px; font-size: 14px; }
+.device-pager .link-btn { margin-right: 10px; }
+.text-entry input { padding: 10px; font-size: 16px; width: 60%; margin-right: 10px; }
+[hidden] { display: none !important; }
+'''
+
+# The page itself is a static shell: everything that depends on the session or the selected device comes from
+# GET /state and is filled in by SCRIPT, so the shell and its assets can be cached and revalidated with a 304.
 HTML = '''
 <!DOCTYPE html>
 <html>
 <head>
     <title>ChoyRoku</title>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .device-select { margin: 20px 0; }
-        .control-grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 10px; margin: 20px 0; }
-        button { padding: 15px; font-size: 16px; border: none; border-radius: 5px; cursor: pointer; }
-        .nav-btn { background: #007bff; color: white; }
-        .media-btn { background: #28a745; color: white; }
-        .volume-btn { background: #ffc107; color: black; }
-        .app-btn { background: #dc3545; color: white; }
-        .status { margin: 10px 0; padding: 10px; border-radius: 5px; }
-        .success { background: #d4edda; color: #155724; }
-        .error { background: #f8d7da; color: #721c24; }
-        select { padding: 10px; font-size: 16px; margin-right: 10px; }
-    </style>
+    <meta name="theme-color" content="{{ theme_color }}">
+    <meta name="apple-mobile-web-app-capable" content="yes">
+    <link rel="manifest" href="/manifest.webmanifest">
+    <link rel="icon" href="{{ icon_url }}" type="image/svg+xml">
+    <link rel="stylesheet" href="{{ style_url }}">
 </head>
 <body>
   <h2>ChoyRoku: Multi Roku Remote</h2>
 
   <div class="device-select">
     <h3>Select a Roku Device</h3>
+    <div class="device-filter">
+      <input type="search" id="device-search" placeholder="Filter by name or address" autocomplete="off">
+      <select id="device-room"><option value="">All rooms</option></select>
+      <select id="device-group"><option value="">All groups</option></select>
+    </div>
     <form method="post" action="/select">
-      <select name="roku_ip">
-        {% for ip, name in devices.items() %}
-          <option value="{{ ip }}" {% if selected == ip %}selected{% endif %}>{{ name }} ({{ ip }})</option>
-        {% endfor %}
-      </select>
+      <select name="roku_ip" id="device-list"></select>
       <button type="submit" class="nav-btn">Select Device</button>
     </form>
+    <div class="device-pager">
+      <button type="button" class="link-btn" id="device-prev">◀ Previous</button>
+      <span id="device-range"></span>
+      <button type="button" class="link-btn" id="device-next">Next ▶</button>
+      <button type="button" class="link-btn" id="rescan">Rescan network</button>
+    </div>
   </div>
 
-  {% if selected %}
+  <div id="controls" hidden>
   <div class="status success">
-    Connected to: {{ devices[selected] }} ({{ selected }})
+    Connected to: <span id="connected-to"></span>
+    <div id="now-playing"></div>
+    <div id="command-status"></div>
   </div>
 
   <h3>Navigation Controls</h3>
   <div class="control-grid">
     <form method="post" action="/send" style="grid-column: 2;">
       <input type="hidden" name="key" value="Up">
-      <button type="submit" class="nav-btn">▲ Up</button>
+      <button type="submit" class="nav-btn" data-hold="Up">▲ Up</button>
     </form>
     <form method="post" action="/send" style="grid-column: 1;">
       <input type="hidden" name="key" value="Left">
-      <button type="submit" class="nav-btn">◀ Left</button>
+      <button type="submit" class="nav-btn" data-hold="Left">◀ Left</button>
     </form>
     <form method="post" action="/send" style="grid-column: 2;">
       <input type="hidden" name="key" value="Select">
@@ -80,11 +286,11 @@ HTML = '''
     </form>
     <form method="post" action="/send" style="grid-column: 3;">
       <input type="hidden" name="key" value="Right">
-      <button type="submit" class="nav-btn">Right ▶</button>
+      <button type="submit" class="nav-btn" data-hold="Right">Right ▶</button>
     </form>
     <form method="post" action="/send" style="grid-column: 2;">
       <input type="hidden" name="key" value="Down">
-      <button type="submit" class="nav-btn">▼ Down</button>
+      <button type="submit" class="nav-btn" data-hold="Down">▼ Down</button>
     </form>
   </div>
 
@@ -108,56 +314,464 @@ HTML = '''
     </form>
   </div>
 
+  <form method="post" action="/seek" class="text-entry">
+    <input type="text" name="position" placeholder="Seek to (1:23:45, 90, +30, -10)" autocomplete="off">
+    <button type="submit" class="media-btn">Seek</button>
+  </form>
+
+  <div data-cap="has_volume">
   <h3>Volume Controls</h3>
   <div class="control-grid">
     <form method="post" action="/send">
       <input type="hidden" name="key" value="VolumeUp">
-      <button type="submit" class="volume-btn">🔊 Vol+</button>
+      <button type="submit" class="volume-btn" data-hold="VolumeUp">🔊 Vol+</button>
     </form>
     <form method="post" action="/send">
       <input type="hidden" name="key" value="VolumeDown">
-      <button type="submit" class="volume-btn">🔉 Vol-</button>
+      <button type="submit" class="volume-btn" data-hold="VolumeDown">🔉 Vol-</button>
+    </form>
+    <form method="post" action="/send">
+      <input type="hidden" name="key" value="VolumeMute">
+      <button type="submit" class="volume-btn">🔇 Mute</button>
     </form>
   </div>
+  </div>
 
-  <h3>Quick Launch Apps</h3>
+  <div data-cap="has_power supports_find_remote">
+  <h3>Power</h3>
   <div class="control-grid">
-    <form method="post" action="/launch">
-      <input type="hidden" name="app_id" value="837">
-      <button type="submit" class="app-btn">📺 YouTube</button>
+    <form method="post" action="/send" data-cap="has_power">
+      <input type="hidden" name="key" value="PowerOn">
+      <button type="submit" class="power-btn">⏻ On</button>
     </form>
-    <form method="post" action="/launch">
-      <input type="hidden" name="app_id" value="12">
-      <button type="submit" class="app-btn">📺 Netflix</button>
+    <form method="post" action="/send" data-cap="has_power">
+      <input type="hidden" name="key" value="PowerOff">
+      <button type="submit" class="power-btn">⏻ Off</button>
+    </form>
+    <form method="post" action="/send" data-cap="supports_find_remote">
+      <input type="hidden" name="key" value="FindRemote">
+      <button type="submit" class="power-btn">🔔 Find Remote</button>
     </form>
-
   </div>
-
-  {% if error_message %}
-  <div class="status error">
-    Error: {{ error_message }}
   </div>
-  {% endif %}
 
-  {% else %}
-  <div class="status error">
-    Please select a Roku device to start controlling it.
+  <h3>Text Entry</h3>
+  <form method="post" action="/text" class="text-entry">
+    <input type="text" name="text" placeholder="Type into the search box" maxlength="{{ text_max_chars }}" autocomplete="off">
+    <select name="layout">
+      <option value="direct">Direct</option>
+      {% for layout in keyboard_layouts %}
+      <option value="{{ layout }}">{{ layout }} keyboard</option>
+      {% endfor %}
+    </select>
+    <button type="submit" class="nav-btn">Send Text</button>
+  </form>
+
+  <h3>Quick Launch Apps</h3>
+  <div class="control-grid" id="apps"></div>
+
+  <div id="macros-section" hidden>
+  <h3>Macros</h3>
+  <div class="control-grid" id="macros"></div>
+  </div>
   </div>
-  {% endif %}
+
+  <div class="status error" id="page-error" hidden></div>
 
   <div style="margin-top: 30px; font-size: 12px; color: #666;">
     <p>Server: {{ server_info }}</p>
-    <p>Available devices: {{ device_count }}</p>
+    <p>Available devices: <span id="device-count"></span></p>
   </div>
+
+  <script src="{{ script_url }}"></script>
 </body>
 </html>
 '''
 
+SCRIPT = '''
+(function () {
+  var $ = function (id) { return document.getElementById(id); };
+  var commandStatus = $('command-status'), nowPlaying = $('now-playing');
+  var current = null, events = null;
+
+  function button(cls, form, children) {
+    var btn = document.createElement('button');
+    btn.type = 'submit';
+    btn.className = cls;
+    children.forEach(function (child) { btn.append(child); });
+    form.append(btn);
+    return form;
+  }
+  function postFormFor(action, fields) {
+    var form = document.createElement('form');
+    form.method = 'post';
+    form.setAttribute('action', action);
+    Object.keys(fields).forEach(function (name) {
+      var input = document.createElement('input');
+      input.type = 'hidden';
+      input.name = name;
+      input.value = fields[name];
+      form.append(input);
+    });
+    return form;
+  }
+
+  // Fill the static shell in from GET /state; called on load and after switching devices
+  function fillFilter(select, names, chosen) {
+    select.replaceChildren(select.options[0]);
+    names.forEach(function (name) { select.append(new Option(name, name, false, name === chosen)); });
+    select.hidden = !names.length;
+  }
+  function applyState(st) {
+    // The device list is one page of a possibly large fleet; the selected device stays listed on every page
+    var list = $('device-list');
+    list.replaceChildren();
+    if (st.selected && !st.devices.some(function (d) { return d.ip === st.selected; })) {
+      list.append(new Option(st.name + ' (' + st.selected + ')', st.selected, false, true));
+    }
+    st.devices.forEach(function (d) {
+      list.append(new Option((d.room ? d.room + ': ' : '') + d.name + ' (' + d.ip + ')', d.ip, false,
+                             d.ip === st.selected));
+    });
+    fillFilter($('device-room'), st.fleet.rooms, query.room);
+    fillFilter($('device-group'), st.fleet.groups, query.group);
+    $('device-range').textContent = st.total ?
+      (st.offset + 1) + '–' + (st.offset + st.devices.length) + ' of ' + st.total : 'No devices';
+    $('device-prev').hidden = st.offset === 0;
+    $('device-next').hidden = st.offset + st.devices.length >= st.total;
+    $('device-count').textContent = st.fleet.count;
+    $('page-error').hidden = !st.error && !!st.selected;
+    $('page-error').textContent = st.error ? 'Error: ' + st.error : 'Please select a Roku device to start controlling it.';
+    $('controls').hidden = !st.selected;
+    if (!st.selected) {
+      current = null;
+      if (events) events.close();
+      if (remote.ws) remote.ws.close();
+      return;
+    }
+    $('connected-to').textContent = st.name + ' (' + st.selected + ')';
+
+    // Unknown capabilities (device unreachable) show every control rather than hiding working ones
+    document.querySelectorAll('[data-cap]').forEach(function (el) {
+      el.hidden = !el.dataset.cap.split(' ').some(function (cap) { return st.caps[cap] !== false; });
+    });
+
+    $('apps').replaceChildren.apply($('apps'), st.apps.map(function (app) {
+      var label = [' ' + app.name];
+      if (app.icon) {
+        var img = document.createElement('img');
+        img.src = app.icon;
+        img.alt = '';
+        img.className = 'app-icon';
+        img.loading = 'lazy';
+        label.unshift(img);
+      } else {
+        label.unshift('📺');
+      }
+      return button('app-btn', postFormFor('/launch', {app_id: app.id}), label);
+    }));
+    $('macros').replaceChildren.apply($('macros'), st.macros.map(function (name) {
+      return button('macro-btn', postFormFor('/macros/' + encodeURIComponent(name) + '/run', {}), ['⚡ ' + name]);
+    }));
+    $('macros-section').hidden = !st.macros.length;
+
+    if (current !== st.selected) {
+      current = st.selected;
+      watchNowPlaying();
+      reconnectRemote();
+    }
+  }
+  var query = {q: '', room: '', group: '', offset: 0};
+  function loadState(refresh) {
+    var params = new URLSearchParams({offset: query.offset});
+    ['q', 'room', 'group'].forEach(function (name) { if (query[name]) params.set(name, query[name]); });
+    if (refresh) params.set('refresh', '1');
+    return fetch('/state?' + params, {headers: {'Accept': 'application/json'}})
+      .then(function (r) { return r.json(); })
+      .then(applyState)
+      .catch(function (err) {
+        $('page-error').hidden = false;
+        $('page-error').textContent = 'Error: ' + err.message;
+      });
+  }
+
+  // Now playing: one shared server-side poll loop per device pushes changes to every open page
+  var clock = function (s) {
+    s = Math.floor(s || 0);
+    var m = Math.floor(s / 60) % 60, h = Math.floor(s / 3600);
+    return (h ? h + ':' + String(m).padStart(2, '0') : m) + ':' + String(s % 60).padStart(2, '0');
+  };
+  function watchNowPlaying() {
+    if (!window.EventSource) return;
+    if (events) events.close();
+    nowPlaying.textContent = '';
+    events = new EventSource('/events');
+    events.onmessage = function (e) {
+      var st = JSON.parse(e.data);
+      if (!st.reachable) { nowPlaying.textContent = 'Device is not responding'; return; }
+      var text = st.app_id ? 'Now in: ' + st.app_name : 'On the home screen';
+      if (st.state !== 'none' && st.position !== null) {
+        text += ' — ' + st.state + ' ' + clock(st.position) + (st.duration ? ' / ' + clock(st.duration) : '');
+      }
+      nowPlaying.textContent = text;
+    };
+  }
+
+  // Remote control channel: while the WebSocket is open, key and launch buttons go over it and the ack shows
+  // the Roku's round-trip time. Without it they are sent with fetch() like every other form.
+  var remote = {ws: null, seq: 0, pending: {}, reopen: false};
+  function connectRemote() {
+    if (!window.WebSocket || !{{ 'true' if websocket else 'false' }}) return;
+    var ws = remote.ws = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
+    ws.onmessage = function (e) {
+      var m = JSON.parse(e.data), sent = remote.pending[m.i];
+      if (m.t !== 'a' || !sent) return;
+      delete remote.pending[m.i];
+      if (sent.t === 'h') return;
+      var what = sent.t === 'k' ? 'Sent ' + sent.k + (m.n ? ' x' + m.n : '') : 'Launched ' + sent.a;
+      if (m.s) what = m.s === 'folded' ? 'Added to repeated ' + sent.k : 'Ignored duplicate ' + (sent.k || sent.a);
+      showStatus(m.ok, m.ok ? what + (m.rtt !== undefined ? ' · ' + m.rtt + ' ms' : '') : 'Error: ' + m.e);
+    };
+    ws.onclose = function () {
+      if (remote.ws !== ws) return;
+      remote.ws = null;
+      remote.pending = {};
+      if (current) setTimeout(connectRemote, remote.reopen ? 0 : 2000);
+      remote.reopen = false;
+    };
+  }
+  // The channel is bound to the device selected when it opened, so switching devices reopens it
+  function reconnectRemote() {
+    if (!remote.ws) return connectRemote();
+    remote.reopen = true;
+    remote.ws.close();
+  }
+  function sendRemote(msg) {
+    if (!remote.ws || remote.ws.readyState !== WebSocket.OPEN) return false;
+    msg.i = ++remote.seq;
+    remote.pending[msg.i] = msg;
+    remote.ws.send(JSON.stringify(msg));
+    return true;
+  }
+
+  // Every form is sent with fetch() and its result shown in place; the page itself is loaded only once
+  function showStatus(ok, text) {
+    commandStatus.textContent = text;
+    commandStatus.className = ok ? '' : 'error-text';
+  }
+  function postForm(form) {
+    var started = performance.now();
+    return fetch(form.getAttribute('action'), {
+      method: 'POST',
+      body: new URLSearchParams(new FormData(form)),
+      headers: {'Accept': 'application/json'}
+    }).then(function (r) {
+      return r.json().then(function (body) {
+        var ok = r.ok && !body.error;
+        showStatus(ok, (ok ? body.message || 'Done' : 'Error: ' + (body.error || body.message || r.status)) +
+                       ' · ' + Math.round(performance.now() - started) + ' ms');
+        return ok;
+      });
+    }).catch(function (err) {
+      showStatus(false, 'Error: ' + err.message);
+      return false;
+    });
+  }
+  document.addEventListener('submit', function (e) {
+    var form = e.target, action = form.getAttribute('action'), msg = null;
+    e.preventDefault();
+    if (action === '/send') msg = {t: 'k', k: form.elements.key.value};
+    if (action === '/launch') msg = {t: 'l', a: form.elements.app_id.value};
+    if (msg && sendRemote(msg)) return;
+    if (action === '/select') {
+      postForm(form).then(function (ok) { if (ok) loadState(); });
+      return;
+    }
+    postForm(form);
+  });
+  $('rescan').addEventListener('click', function () { loadState(true); });
+  var searchTimer = null;
+  function filterBy(name, value) {
+    query[name] = value;
+    query.offset = 0;
+    loadState();
+  }
+  $('device-search').addEventListener('input', function (e) {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(function () { filterBy('q', e.target.value.trim()); }, 250);
+  });
+  $('device-room').addEventListener('change', function (e) { filterBy('room', e.target.value); });
+  $('device-group').addEventListener('change', function (e) { filterBy('group', e.target.value); });
+  $('device-prev').addEventListener('click', function () {
+    query.offset = Math.max(0, query.offset - {{ page_size }});
+    loadState();
+  });
+  $('device-next').addEventListener('click', function () {
+    query.offset += {{ page_size }};
+    loadState();
+  });
+
+  // Press-and-hold: arrow and volume buttons hold the key while pressed instead of submitting once.
+  // The hold is renewed while the finger stays down; if renewals stop the server releases the key.
+  document.querySelectorAll('[data-hold]').forEach(function (btn) {
+    var renewTimer = null;
+    // Without the WebSocket each hold request may take its own connection; chain them so a quick tap's
+    // release can never reach the server before its press and leave the key held
+    var holdChain = Promise.resolve();
+    function hold(action) {
+      if (sendRemote({t: 'h', k: btn.dataset.hold, a: action === 'down' ? 'd' : 'u'})) return;
+      var body = new URLSearchParams({key: btn.dataset.hold, action: action});
+      holdChain = holdChain.then(function () {
+        return fetch('/hold', {method: 'POST', body: body, keepalive: action === 'up'});
+      }).catch(function () {});
+    }
+    function release() {
+      if (renewTimer === null) return;
+      clearInterval(renewTimer);
+      renewTimer = null;
+      hold('up');
+    }
+    btn.addEventListener('pointerdown', function (e) {
+      e.preventDefault();
+      if (renewTimer !== null) return;
+      hold('down');
+      renewTimer = setInterval(function () { hold('down'); }, {{ hold_renew_ms }});
+    });
+    ['pointerup', 'pointerleave', 'pointercancel'].forEach(function (type) {
+      btn.addEventListener(type, release);
+    });
+    // A pointer press was already sent as a hold; Enter or Space (click with no pointer, detail 0) submits once
+    btn.addEventListener('click', function (e) { if (e.detail !== 0) e.preventDefault(); });
+  });
+  document.addEventListener('visibilitychange', function () {
+    if (document.hidden) document.querySelectorAll('[data-hold]').forEach(function (btn) {
+      btn.dispatchEvent(new Event('pointercancel'));
+    });
+  });
+
+  loadState(/[?&]refresh=1/.test(location.search));
+  // Keeps the shell on the phone so the remote opens without waiting on the server (HTTPS or localhost only)
+  if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js');
+})();
+'''
+
+ICON_SVG = '''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 512 512">
+<rect width="512" height="512" rx="96" fill="#007bff"/>
+<rect x="176" y="64" width="160" height="384" rx="48" fill="#fff"/>
+<circle cx="256" cy="176" r="44" fill="#007bff"/>
+<circle cx="256" cy="176" r="16" fill="#fff"/>
+<rect x="216" y="268" width="80" height="20" rx="10" fill="#dc3545"/>
+<rect x="216" y="316" width="80" height="20" rx="10" fill="#28a745"/>
+<rect x="216" y="364" width="80" height="20" rx="10" fill="#ffc107"/>
+</svg>
+'''
+
+# Precaches the shell and its assets, and keeps app icons as they are fetched. Device state (/state, /events),
+# commands and the WebSocket channel always go to the network. The version changes whenever the shell or an
+# asset does, which makes the browser install the new worker and drop the old shell.
+SERVICE_WORKER = '''
+var VERSION = '{{ version }}';
+var SHELL_CACHE = 'choyroku-shell-' + VERSION, ICON_CACHE = 'choyroku-icons';
+var SHELL = {{ shell_urls | tojson }};
+
+self.addEventListener('install', function (e) {
+  e.waitUntil(caches.open(SHELL_CACHE).then(function (cache) { return cache.addAll(SHELL); })
+    .then(function () { return self.skipWaiting(); }));
+});
+
+self.addEventListener('activate', function (e) {
+  e.waitUntil(caches.keys().then(function (names) {
+    return Promise.all(names.filter(function (name) {
+      return name.indexOf('choyroku-shell-') === 0 && name !== SHELL_CACHE;
+    }).map(function (name) { return caches.delete(name); }));
+  }).then(function () { return self.clients.claim(); }));
+});
+
+function cacheIcon(request) {
+  return fetch(request).then(function (resp) {
+    if (!resp.ok) return resp;
+    var copy = resp.clone();
+    caches.open(ICON_CACHE).then(function (cache) {
+      return cache.put(request, copy).then(function () { return cache.keys(); }).then(function (keys) {
+        // Oldest first; icon URLs are versioned, so superseded ones age out here
+        return Promise.all(keys.slice(0, Math.max(0, keys.length - {{ icon_entries }})).map(function (key) {
+          return cache.delete(key);
+        }));
+      });
+    });
+    return resp;
+  });
+}
+
+self.addEventListener('fetch', function (e) {
+  var req = e.request, url = new URL(req.url);
+  if (req.method !== 'GET' || url.origin !== location.origin) return;
+  if (req.mode === 'navigate' && url.pathname === '/') {
+    // ?refresh=1 is read by the page script, so any query gets the cached shell
+    e.respondWith(caches.match('/', {cacheName: SHELL_CACHE}).then(function (hit) { return hit || fetch(req); }));
+  } else if (url.pathname.indexOf('/assets/') === 0 || url.pathname === '/manifest.webmanifest') {
+    e.respondWith(caches.match(req).then(function (hit) { return hit || fetch(req); }));
+  } else if (url.pathname.indexOf('/icon/') === 0) {
+    e.respondWith(caches.match(req, {cacheName: ICON_CACHE}).then(function (hit) { return hit || cacheIcon(req); }));
+  }
+});
+'''
+
+def _asset(body, mimetype):
+    data = body.encode("utf-8")
+    return {"body": data, "mimetype": mimetype, "etag": hashlib.sha1(data).hexdigest()[:16]}
+
+# Everything below is constant for the life of the process, so it is rendered once here rather than per request
+ASSETS = {
+    "app.css": _asset(STYLE, "text/css"),
+    "app.js": _asset(app.jinja_env.from_string(SCRIPT).render(
+        websocket=sock is not None, hold_renew_ms=int(HOLD_SAFETY_TIMEOUT * 1000 / 3),
+        page_size=DEVICE_PAGE_SIZE), "application/javascript"),
+}
+ASSETS["icon.svg"] = _asset(ICON_SVG, "image/svg+xml")
+ASSET_URLS = {name: f"/assets/{name}?v={item['etag']}" for name, item in ASSETS.items()}
+SHELL = _asset(app.jinja_env.from_string(HTML).render(
+    style_url=ASSET_URLS["app.css"], script_url=ASSET_URLS["app.js"], icon_url=ASSET_URLS["icon.svg"],
+    theme_color=APP_THEME_COLOR, server_info=f"{FLASK_HOST}:{FLASK_PORT}",
+    keyboard_layouts=sorted(KEYBOARD_LAYOUTS), text_max_chars=TEXT_INPUT_MAX_CHARS), "text/html")
+MANIFEST = _asset(json.dumps({
+    "name": APP_NAME,
+    "short_name": APP_NAME,
+    "description": "Multi Roku remote",
+    "start_url": "/",
+    "scope": "/",
+    "display": "standalone",
+    "background_color": "#ffffff",
+    "theme_color": APP_THEME_COLOR,
+    "icons": [{"src": ASSET_URLS["icon.svg"], "sizes": "any", "type": "image/svg+xml", "purpose": "any"}],
+}, indent=2), "application/manifest+json")
+SHELL_URLS = ["/", "/manifest.webmanifest"] + sorted(ASSET_URLS.values())
+_shell_version = hashlib.sha1("".join([SHELL["etag"], MANIFEST["etag"]] + SHELL_URLS).encode()).hexdigest()[:12]
+SERVICE_WORKER_JS = _asset(app.jinja_env.from_string(SERVICE_WORKER).render(
+    version=_shell_version, shell_urls=SHELL_URLS, icon_entries=SW_ICON_CACHE_ENTRIES), "application/javascript")
+
+_gzip_cache = OrderedDict()
+_gzip_lock = threading.Lock()
+
+def gzip_body(body, etag=None):
+    """Compress a response body, reusing the result for bodies with a known ETag"""
+    if etag:
+        with _gzip_lock:
+            if etag in _gzip_cache:
+                _gzip_cache.move_to_end(etag)
+                return _gzip_cache[etag]
+    compressed = gzip.compress(body, compresslevel=6)
+    if etag:
+        with _gzip_lock:
+            _gzip_cache[etag] = compressed
+            while len(_gzip_cache) > GZIP_CACHE_ENTRIES:
+                _gzip_cache.popitem(last=False)
+    return compressed
+
 def discover_rokus(timeout=3):
     """Discover Roku devices on the network"""
-    fallback_ips = [ROKU1_IP]
-    if ROKU2_IP:
-        fallback_ips.append(ROKU2_IP)
+    with _registry_lock:
+        fallback_ips = [d["ip"] for d in _devices.values() if d["source"] == "config"]
     
     found = {}
     
@@ -173,6 +787,8 @@ def discover_rokus(timeout=3):
         )
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Every device answers within MX seconds; the default buffer overflows at a few hundred of them
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
         sock.settimeout(timeout)
         sock.sendto(message.encode('utf-8'), ('239.255.255.250', 1900))
 
@@ -188,21 +804,226 @@ def discover_rokus(timeout=3):
     except Exception as e:
         logger.error(f"SSDP discovery failed: {e}")
 
-    # Fallback to manual IP checking
+    # Fallback to checking the configured addresses, all at once so a large fleet does not take minutes
     if not found:
         logger.info("Trying manual IP discovery...")
-        for ip in fallback_ips:
+
+        def probe(ip):
             try:
                 resp = requests.get(f"http://{ip}:8060/query/device-info", timeout=2)
                 if resp.status_code == 200:
                     name_match = re.search(r"<user-device-name>(.*?)</user-device-name>", resp.text)
-                    found[ip] = name_match.group(1) if name_match else f"Roku ({ip})"
-                    logger.info(f"Found Roku via manual check: {ip} - {found[ip]}")
+                    return name_match.group(1) if name_match else f"Roku ({ip})"
             except Exception as e:
                 logger.error(f"Manual check failed for {ip}: {e}")
+            return None
+
+        for ip, name in zip(fallback_ips, _broadcast_pool.map(probe, fallback_ips)):
+            if name:
+                found[ip] = name
+                logger.info(f"Found Roku via manual check: {ip} - {name}")
 
     return found
 
+# Device registry: every known device with indexes by id, IP, room and group. Entries come from DEVICES_FILE
+# (or the ROKU1_IP/ROKU2_IP/DEVICE_GROUPS seed without one) and from discovery.
+_devices = {}  # device id -> {id, ip, name, room, groups, source, last_seen}
+_device_index = {"ip": {}, "room": {}, "group": {}, "order": []}  # ip -> id; room/group -> ids; all ids sorted
+_devices_mtime = None
+_registry_lock = threading.Lock()
+_discovery = {"at": None, "refreshing": False}
+
+def _device_sort_key(device):
+    return ((device["room"] or "").lower(), (device["name"] or device["ip"]).lower(), device["id"])
+
+def _rebuild_device_index():
+    """Rebuild the lookup indexes; called with _registry_lock held after any change to _devices"""
+    ordered = sorted(_devices.values(), key=_device_sort_key)
+    by_room, by_group = {}, {}
+    for device in ordered:
+        if device["room"]:
+            by_room.setdefault(device["room"], []).append(device["id"])
+        for group in device["groups"]:
+            by_group.setdefault(group, []).append(device["id"])
+    _device_index.update(ip={d["ip"]: d["id"] for d in ordered}, room=by_room, group=by_group,
+                         order=[d["id"] for d in ordered])
+
+def validate_device(entry):
+    """Normalise one DEVICES_FILE entry, raising ValueError if it is unusable.
+
+    Entries look like {"id": "living-room", "ip": "192.168.1.129", "name": "Living Room TV",
+    "room": "Living Room", "groups": ["downstairs"]}; only "ip" is required and the id defaults to it.
+    """
+    if not isinstance(entry, dict) or not isinstance(entry.get("ip"), str) or not entry["ip"].strip():
+        raise ValueError("Each device needs an ip")
+    groups = entry.get("groups", [])
+    if not isinstance(groups, list) or not all(isinstance(g, str) for g in groups):
+        raise ValueError(f"groups for {entry['ip']} must be a list of names")
+    for field in ("name", "room"):
+        if entry.get(field) is not None and not isinstance(entry[field], str):
+            raise ValueError(f"{field} for {entry['ip']} must be a string")
+    device_id = entry.get("id")
+    if device_id is not None and (isinstance(device_id, bool) or not isinstance(device_id, (str, int))):
+        raise ValueError(f"id for {entry['ip']} must be a string")
+    ip = entry["ip"].strip()
+    return {"id": str(entry.get("id") or ip), "ip": ip, "name": entry.get("name"), "room": entry.get("room"),
+            "groups": groups, "source": "config", "last_seen": None}
+
+def load_devices():
+    """(Re)load the registry from DEVICES_FILE, keeping discovered devices the file does not claim"""
+    global _devices_mtime
+    try:
+        mtime = os.path.getmtime(DEVICES_FILE)
+    except OSError:
+        mtime = None
+    if mtime is None:
+        seed = {ip: {"ip": ip, "groups": []} for ip in (ROKU1_IP, ROKU2_IP) if ip}
+        for group, members in DEVICE_GROUPS.items():
+            for ip in members:
+                seed.setdefault(ip, {"ip": ip, "groups": []})["groups"].append(group)
+        entries = list(seed.values())
+    else:
+        try:
+            with open(DEVICES_FILE) as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                entries = entries.get("devices", [])
+            if not isinstance(entries, list):
+                raise ValueError("expected a list of devices")
+        except Exception as e:
+            logger.error(f"Could not load devices from {DEVICES_FILE}: {e}")
+            # Noted anyway, so a broken file is reported once rather than on every request
+            with _registry_lock:
+                _devices_mtime = mtime
+            return
+    configured = {}
+    for entry in entries:
+        try:
+            device = validate_device(entry)
+        except ValueError as e:
+            logger.error(f"Skipping device in {DEVICES_FILE}: {e}")
+            continue
+        configured[device["id"]] = device
+    claimed = {d["ip"] for d in configured.values()}
+    with _registry_lock:
+        for device in _devices.values():
+            if device["source"] == "discovered" and device["ip"] not in claimed:
+                configured.setdefault(device["id"], device)
+            elif device["ip"] in claimed and device["last_seen"]:
+                match = next(d for d in configured.values() if d["ip"] == device["ip"])
+                match["last_seen"] = device["last_seen"]
+                match["name"] = match["name"] or device["name"]
+        _devices.clear()
+        _devices.update(configured)
+        _devices_mtime = mtime
+        _rebuild_device_index()
+    logger.info(f"Device registry has {len(configured)} device(s)")
+
+def _reload_devices_if_changed():
+    try:
+        mtime = os.path.getmtime(DEVICES_FILE)
+    except OSError:
+        mtime = None
+    if mtime != _devices_mtime:
+        load_devices()
+
+def merge_discovered(found):
+    """Add or refresh devices from a discovery pass ({ip: name}); configured names, rooms and groups win"""
+    now = time.time()
+    with _registry_lock:
+        for ip, name in found.items():
+            device_id = _device_index["ip"].get(ip)
+            if device_id is None:
+                _devices[ip] = {"id": ip, "ip": ip, "name": name, "room": None, "groups": [],
+                                "source": "discovered", "last_seen": now}
+            else:
+                device = _devices[device_id]
+                device["last_seen"] = now
+                if device["source"] == "discovered" or not device["name"]:
+                    device["name"] = name
+        _rebuild_device_index()
+
+def _refresh_discovery():
+    try:
+        merge_discovered(discover_rokus())
+        with _registry_lock:
+            _discovery["at"] = time.monotonic()
+    finally:
+        with _registry_lock:
+            _discovery["refreshing"] = False
+
+def refresh_devices(force=False):
+    """Keep the registry current: pick up DEVICES_FILE edits and run discovery every DISCOVERY_CACHE_TTL.
+
+    Discovery runs in the background; only a forced refresh, or a first pass with no devices configured,
+    waits for SSDP, so page loads and API calls stay fast.
+    """
+    _reload_devices_if_changed()
+    if not DEVICE_DISCOVERY and not force:
+        return
+    with _registry_lock:
+        never = _discovery["at"] is None
+        stale = never or time.monotonic() - _discovery["at"] > DISCOVERY_CACHE_TTL
+        if not force and (_devices or not never):
+            if stale and not _discovery["refreshing"]:
+                _discovery["refreshing"] = True
+                threading.Thread(target=_refresh_discovery, name="discovery", daemon=True).start()
+            return
+        _discovery["refreshing"] = True
+    _refresh_discovery()
+
+def device_view(device):
+    """Public fields of a registry entry"""
+    return {"id": device["id"], "ip": device["ip"], "name": device["name"] or f"Roku ({device['ip']})",
+            "room": device["room"], "groups": device["groups"], "source": device["source"]}
+
+def find_device(key):
+    """Look a device up by id or IP; returns its public view or None"""
+    with _registry_lock:
+        device = _devices.get(key) or _devices.get(_device_index["ip"].get(key))
+        return device_view(device) if device else None
+
+def list_devices(room=None, group=None, q=None, offset=0, limit=DEVICE_PAGE_SIZE):
+    """Return (page, total) of devices in display order, filtered by room, group and a name/id/IP search.
+
+    Room and group filters start from their index rather than scanning the fleet.
+    """
+    with _registry_lock:
+        if room:
+            ids = _device_index["room"].get(room, [])
+            if group:
+                ids = [i for i in ids if group in _devices[i]["groups"]]
+        elif group:
+            ids = _device_index["group"].get(group, [])
+        else:
+            ids = _device_index["order"]
+        if q:
+            q = q.lower()
+            ids = [i for i in ids if q in i.lower() or q in _devices[i]["ip"]
+                   or q in (_devices[i]["name"] or "").lower()]
+        return [device_view(_devices[i]) for i in ids[offset:offset + limit]], len(ids)
+
+def registry_summary():
+    """Fleet size plus the room and group names, for filter menus"""
+    with _registry_lock:
+        return {"count": len(_devices), "rooms": sorted(_device_index["room"]),
+                "groups": sorted(_device_index["group"])}
+
+def page_args(args):
+    """Read offset/limit query parameters, clamped to DEVICE_PAGE_MAX"""
+    try:
+        offset = max(0, int(args.get("offset", 0)))
+        limit = min(DEVICE_PAGE_MAX, max(1, int(args.get("limit", DEVICE_PAGE_SIZE))))
+    except ValueError:
+        raise ValueError("offset and limit must be integers")
+    return offset, limit
+
+load_devices()
+
+def wants_json():
+    """True for fetch() calls from the page, which ask for JSON instead of a redirect"""
+    return request.accept_mimetypes.best == "application/json"
+
 def test_roku_connection(roku_ip):
     """Test if a Roku device is reachable"""
     try:
@@ -212,27 +1033,1732 @@ def test_roku_connection(roku_ip):
         logger.error(f"Connection test failed for {roku_ip}: {e}")
         return False
 
+def get_device_info(roku_ip, timeout=3):
+    """Fetch /query/device-info and return its fields as a dict, or None if unreachable"""
+    try:
+        resp = requests.get(f"http://{roku_ip}:8060/query/device-info", timeout=timeout)
+        if resp.status_code != 200:
+            return None
+        root = ET.fromstring(resp.content)
+        return {child.tag: (child.text or "").strip() for child in root}
+    except Exception as e:
+        logger.error(f"device-info query failed for {roku_ip}: {e}")
+        return None
+
+def get_power_mode(roku_ip, timeout=3):
+    """Return the device's power-mode (PowerOn, DisplayOff, Ready, ...) or None if unreachable"""
+    info = get_device_info(roku_ip, timeout=timeout)
+    if info is None:
+        return None
+    # Streaming sticks and boxes have no standby state and omit the field
+    return info.get("power-mode", "PowerOn")
+
+def get_media_player(roku_ip, timeout=3):
+    """Query /query/media-player; returns {state, position, duration, is_live} with times in seconds"""
+    resp = requests.get(f"http://{roku_ip}:8060/query/media-player", timeout=timeout)
+    resp.raise_for_status()
+    root = ET.fromstring(resp.content)
+
+    def seconds(tag):
+        match = re.match(r"\s*(\d+)", root.findtext(tag) or "")
+        return int(match.group(1)) / 1000 if match else None
+
+    return {
+        "state": root.get("state", "none"),
+        "position": seconds("position"),
+        "duration": seconds("duration"),
+        "is_live": (root.findtext("is_live") or "").strip() == "true",
+    }
+
+_capabilities = {}  # roku_ip -> capability flags, parsed once per device
+_capabilities_failed = {}  # roku_ip -> when device-info last went unanswered
+
+def get_capabilities(roku_ip):
+    """Capability flags parsed once from /query/device-info and cached; None if the device is unreachable.
+
+    A failed probe is remembered for PROBE_RETRY_AFTER, so requests to a dead device do not each wait on it.
+    """
+    caps = _capabilities.get(roku_ip)
+    if caps is not None:
+        return caps
+    failed_at = _capabilities_failed.get(roku_ip)
+    if failed_at is not None and time.monotonic() - failed_at < PROBE_RETRY_AFTER:
+        return None
+    info = get_device_info(roku_ip)
+    if info is None:
+        _capabilities_failed[roku_ip] = time.monotonic()
+        return None
+    _capabilities_failed.pop(roku_ip, None)
+
+    def flag(name):
+        return info.get(name, "false").lower() == "true"
+
+    is_tv = flag("is-tv")
+    caps = {
+        "is_tv": is_tv,
+        "is_stick": flag("is-stick"),
+        "supports_suspend": flag("supports-suspend"),
+        "supports_find_remote": flag("supports-find-remote"),
+        "supports_private_listening": flag("supports-private-listening"),
+        "supports_wake_on_wlan": flag("supports-wake-on-wlan"),
+        "has_volume": is_tv,
+        "has_power": is_tv or flag("supports-suspend"),
+        "model": info.get("model-name", ""),
+    }
+    caps.update(CAPABILITY_OVERRIDES.get(roku_ip, {}))
+    _capabilities[roku_ip] = caps
+    return caps
+
+def unsupported_key_error(roku_ip, key):
+    """Return an error message if the device cannot act on key, or None if it can (or is unknown)"""
+    needed = KEY_CAPABILITIES.get(key)
+    if needed is None:
+        return None
+    caps = get_capabilities(roku_ip)
+    if caps is None or caps.get(needed, True):
+        return None
+    return f"{key} is not supported by {roku_ip} ({caps['model'] or 'this device'})"
+
+def ecp_post(roku_ip, path, timeout=5):
+    """POST an ECP command and return the HTTP status code"""
+    if path.startswith("keypress/") and path[len("keypress/"):] in APP_CHANGING_KEYS:
+        forget_active_app(roku_ip)
+    r = requests.post(f"http://{roku_ip}:8060/{path}", timeout=timeout)
+    poke_device(roku_ip)
+    return r.status_code
+
+def get_active_app(roku_ip, timeout=2):
+    """Return (app_id, name) for the app in the foreground; app_id is None on the home screen"""
+    resp = requests.get(f"http://{roku_ip}:8060/query/active-app", timeout=timeout)
+    resp.raise_for_status()
+    app_elem = ET.fromstring(resp.content).find("app")
+    if app_elem is None:
+        return None, None
+    return app_elem.get("id"), (app_elem.text or "").strip()
+
+_active_apps = {}      # roku_ip -> (app_id, fetched_at)
+_active_app_used = {}  # roku_ip -> when a launch last asked about it
+_active_app_changed = {}  # roku_ip -> when a launch or app-changing key last made the cached app stale
+_now_playing = {}      # roku_ip -> latest now-playing state
+_watchers = {}         # roku_ip -> set of queues, one per connected browser
+_pollers = {}          # roku_ip -> Event that wakes the device's poll loop early
+_state_lock = threading.Lock()
+
+def _read_now_playing(roku_ip, with_player):
+    """Poll active-app (and media-player when a browser wants it) into a now-playing state dict"""
+    state = {"device": roku_ip, "reachable": True, "app_id": None, "app_name": None,
+             "state": "none", "position": None, "duration": None}
+    try:
+        asked_at = time.monotonic()
+        state["app_id"], state["app_name"] = get_active_app(roku_ip)
+        note_active_app(roku_ip, state["app_id"], asked_at=asked_at)
+        if with_player and state["app_id"] is not None:
+            player = get_media_player(roku_ip)
+            state.update(state=player["state"], position=player["position"], duration=player["duration"])
+    except Exception as e:
+        logger.debug(f"now-playing poll failed for {roku_ip}: {e}")
+        forget_active_app(roku_ip)
+        state["reachable"] = False
+    return state
+
+def _poll_device(roku_ip, poke):
+    """Single poll loop for one device, shared by every browser watching it and by the active-app cache.
+
+    Polls every NOW_PLAYING_FAST seconds while media plays and someone is watching, backs off towards
+    NOW_PLAYING_IDLE_MAX while nothing changes, drops to active-app-only refreshes once nobody is connected,
+    and exits when the device has been neither watched nor launched on for ACTIVE_APP_IDLE_STOP seconds.
+    """
+    interval = NOW_PLAYING_WATCHED
+    last = None
+    while True:
+        with _state_lock:
+            watched = bool(_watchers.get(roku_ip))
+            used = _active_app_used.get(roku_ip, 0)
+            if not watched and time.monotonic() - used > ACTIVE_APP_IDLE_STOP:
+                del _pollers[roku_ip]
+                _now_playing.pop(roku_ip, None)
+                _active_apps.pop(roku_ip, None)
+                _active_app_changed.pop(roku_ip, None)
+                return
+
+        state = _read_now_playing(roku_ip, with_player=watched)
+        # Position ticks while playing; only app or play-state changes reset the back-off
+        changed = last is None or any(state[k] != last[k] for k in ("reachable", "app_id", "state"))
+        if watched and state != last:
+            _publish_now_playing(roku_ip, state)
+        last = state
+
+        playing = state["state"] == "play"
+        if not watched:
+            interval = ACTIVE_APP_REFRESH
+        elif playing:
+            interval = NOW_PLAYING_FAST
+        elif changed:
+            interval = NOW_PLAYING_WATCHED
+        else:
+            interval = min(interval * 1.5, NOW_PLAYING_IDLE_MAX)
+
+        if poke.wait(interval):
+            # A command was just sent: give the device a moment to react, then poll right away
+            time.sleep(NOW_PLAYING_SETTLE)
+            poke.clear()
+            interval = NOW_PLAYING_WATCHED
+
+def _ensure_poller(roku_ip):
+    """Start the device's poll loop if it is not running; caller holds _state_lock"""
+    if roku_ip not in _pollers:
+        _pollers[roku_ip] = threading.Event()
+        threading.Thread(target=_poll_device, args=(roku_ip, _pollers[roku_ip]),
+                         name=f"poll-{roku_ip}", daemon=True).start()
+
+def poke_device(roku_ip):
+    """Ask a running poll loop to refresh soon, e.g. right after a command changed the device's state"""
+    with _state_lock:
+        poke = _pollers.get(roku_ip)
+    if poke is not None:
+        poke.set()
+
+def _publish_now_playing(roku_ip, state):
+    with _state_lock:
+        _now_playing[roku_ip] = state
+        subscribers = list(_watchers.get(roku_ip, ()))
+    for q in subscribers:
+        try:
+            q.put_nowait(state)
+        except queue.Full:
+            # A slow client only needs the newest state
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(state)
+
+def subscribe_now_playing(roku_ip):
+    """Register a browser for now-playing updates; returns the queue its states arrive on"""
+    q = queue.Queue(maxsize=16)
+    with _state_lock:
+        _watchers.setdefault(roku_ip, set()).add(q)
+        if roku_ip in _now_playing:
+            q.put_nowait(_now_playing[roku_ip])
+        _ensure_poller(roku_ip)
+        poke = _pollers[roku_ip]
+    poke.set()  # A new viewer may have switched the loop from slow refreshes to full polling
+    return q
+
+def unsubscribe_now_playing(roku_ip, q):
+    with _state_lock:
+        subscribers = _watchers.get(roku_ip)
+        if subscribers is not None:
+            subscribers.discard(q)
+            if not subscribers:
+                del _watchers[roku_ip]
+
+def cached_active_app(roku_ip):
+    """Return the cached foreground app id if it is fresh, else None; never blocks on the device.
+
+    Asking about a device also enrolls it in the background refresh, so the next launch finds a warm value.
+    """
+    now = time.monotonic()
+    with _state_lock:
+        _active_app_used[roku_ip] = now
+        _ensure_poller(roku_ip)
+        cached = _active_apps.get(roku_ip)
+    if cached is None or now - cached[1] > ACTIVE_APP_MAX_AGE:
+        return None
+    return cached[0]
+
+def note_active_app(roku_ip, app_id, asked_at=None):
+    """Cache the foreground app; asked_at is when a poll sent its query, so an answer from before the
+    latest launch or app-changing key cannot overwrite what that launch or key established"""
+    now = time.monotonic()
+    with _state_lock:
+        if asked_at is not None and asked_at < _active_app_changed.get(roku_ip, float("-inf")):
+            return
+        _active_apps[roku_ip] = (app_id, now)
+        if asked_at is None:
+            _active_app_changed[roku_ip] = now
+
+def forget_active_app(roku_ip):
+    with _state_lock:
+        _active_apps.pop(roku_ip, None)
+        _active_app_changed[roku_ip] = time.monotonic()
+
+def launch_app(roku_ip, app_id, params=None):
+    """Launch an app unless it is already in the foreground.
+
+    Returns (status_code, outcome) where outcome is "launched", "skipped" (already active, nothing sent)
+    or "deep-linked" (already active, content parameters passed through /input without a restart).
+    """
+    app_id = str(app_id)
+    query = f"?{urlencode(params)}" if params else ""
+    if cached_active_app(roku_ip) == app_id:
+        if not params:
+            return 200, "skipped"
+        return ecp_post(roku_ip, f"input/{app_id}{query}"), "deep-linked"
+    status_code = ecp_post(roku_ip, f"launch/{app_id}{query}")
+    if status_code in [200, 204]:
+        note_active_app(roku_ip, app_id)
+    return status_code, "launched"
+
+_wake_locks = {}
+_wake_locks_guard = threading.Lock()
+
+def wake_roku(roku_ip, timeout=WAKE_TIMEOUT):
+    """Send PowerOn if the device is in standby and poll with exponential backoff until it is ready.
+
+    Returns True as soon as the device reports PowerOn, False if it did not wake within timeout, and None
+    at once if it does not answer at all (nothing could be sent to wake it, so there is nothing to wait for).
+    Concurrent callers for the same device share a single wake-up instead of each sending PowerOn.
+    """
+    with _wake_locks_guard:
+        lock = _wake_locks.setdefault(roku_ip, threading.Lock())
+
+    with lock:
+        mode = get_power_mode(roku_ip)
+        if mode == "PowerOn":
+            return True
+        if mode is None:
+            logger.error(f"{roku_ip} is not responding")
+            return None
+        # Whatever was cached as the foreground app did not survive standby
+        forget_active_app(roku_ip)
+
+        deadline = time.monotonic() + timeout
+        delay = WAKE_POLL_INITIAL
+        power_on_sent = False
+        while True:
+            # A device waking up may drop off the network for a moment; send PowerOn only while it
+            # answers, and only once
+            if mode is not None and not power_on_sent:
+                try:
+                    logger.info(f"{roku_ip} is in power-mode {mode}, sending PowerOn")
+                    ecp_post(roku_ip, "keypress/PowerOn")
+                    power_on_sent = True
+                except Exception as e:
+                    logger.error(f"Error sending PowerOn to {roku_ip}: {e}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error(f"{roku_ip} did not wake within {timeout}s (last power-mode: {mode})")
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, WAKE_POLL_MAX)
+
+            mode = get_power_mode(roku_ip, timeout=min(2, WAKE_POLL_MAX))
+            if mode == "PowerOn":
+                logger.info(f"{roku_ip} is ready")
+                return True
+
+def run_when_ready(roku_ip, action, timeout=WAKE_TIMEOUT):
+    """Wake the device if needed, then run action() the moment it is ready.
+
+    Returns (ready, result, waited_seconds) with ready as from wake_roku; action is not run unless it is True.
+    """
+    start = time.monotonic()
+    ready = wake_roku(roku_ip, timeout=timeout)
+    waited = time.monotonic() - start
+    if not ready:
+        return ready, None, waited
+    return True, action(), waited
+
+def dispatch_command(roku_ip, key=None, app_id=None, wake=True, params=None):
+    """Send one keypress or app launch to a device and return a result dict with its timing"""
+    start = time.monotonic()
+    try:
+        outcome = None
+        if key:
+            error = unsupported_key_error(roku_ip, key)
+            if error:
+                return {"success": False, "error": error, "unsupported": True, "ms": 0.0}
+            status_code = ecp_post(roku_ip, f"keypress/{key}")
+        elif wake:
+            ready, launched, _ = run_when_ready(roku_ip, lambda: launch_app(roku_ip, app_id, params))
+            if not ready:
+                error = "is not responding" if ready is None else f"did not wake up within {WAKE_TIMEOUT}s"
+                return {"success": False, "error": error, "ms": round((time.monotonic() - start) * 1000, 1)}
+            status_code, outcome = launched
+        else:
+            status_code, outcome = launch_app(roku_ip, app_id, params)
+        result = {"success": status_code in [200, 204], "status": status_code,
+                  "ms": round((time.monotonic() - start) * 1000, 1)}
+        if outcome:
+            result["outcome"] = outcome
+        return result
+    except Exception as e:
+        logger.error(f"Error dispatching {key or app_id} to {roku_ip}: {e}")
+        return {"success": False, "error": str(e), "ms": round((time.monotonic() - start) * 1000, 1)}
+
+_presses = {}  # (client, roku_ip, key) -> {"sent": when last let through, "inflight": since, "pending": folded presses}
+_presses_lock = threading.Lock()
+
+def debounce_window(key):
+    """Seconds within which an identical press of key from the same client counts as a duplicate"""
+    if key in DEBOUNCE_KEY_WINDOWS_MS:
+        return DEBOUNCE_KEY_WINDOWS_MS[key] / 1000
+    return (DEBOUNCE_REPEAT_WINDOW_MS if key in REPEATABLE_KEYS else DEBOUNCE_WINDOW_MS) / 1000
+
+def launch_press_key(app_id, params=None):
+    """Debounce key for a launch; deep links to different content are different presses"""
+    query = f"?{urlencode(sorted(params.items()))}" if params else ""
+    return f"launch:{app_id}{query}"
+
+def admit_press(client, roku_ip, key):
+    """Decide what happens to one press before it reaches the device: "send", "drop" or "fold".
+
+    A press within the debounce window of the last one let through is a duplicate and is dropped. A repeatable
+    key pressed again while the previous press is still in flight is folded into that press, which sends it
+    (see finish_press) so the count survives without another request to the device.
+    """
+    now = time.monotonic()
+    with _presses_lock:
+        if len(_presses) > 4096:
+            for k in [k for k, v in _presses.items() if not v["inflight"] and now - v["sent"] > 60]:
+                del _presses[k]
+        entry = _presses.setdefault((client, roku_ip, key), {"sent": float("-inf"), "inflight": None, "pending": 0})
+        if now - entry["sent"] < debounce_window(key):
+            return "drop"
+        if key in REPEATABLE_KEYS and DEBOUNCE_FOLD_REPEATS:
+            if entry["inflight"] is not None and now - entry["inflight"] < DEBOUNCE_INFLIGHT_MAX:
+                entry["pending"] += 1
+                return "fold"
+            entry["inflight"] = now
+        entry["sent"] = now
+        return "send"
+
+def finish_press(client, roku_ip, key):
+    """Called by the request that sent a press: returns the presses folded into it meanwhile, and frees the
+    slot once there are none left to send"""
+    with _presses_lock:
+        entry = _presses.get((client, roku_ip, key))
+        if entry is None:
+            return 0
+        pending, entry["pending"] = entry["pending"], 0
+        if not pending:
+            entry["inflight"] = None
+        return pending
+
+def debounced_key(client, roku_ip, key):
+    """dispatch_command for a key press from an interactive client, with duplicate-tap suppression.
+
+    Returns dispatch_command's result, with "suppressed": "duplicate" or "folded" (nothing sent by this call)
+    or "presses": n when folded presses were sent along with this one.
+    """
+    decision = admit_press(client, roku_ip, key)
+    if decision == "drop":
+        logger.info(f"Dropped duplicate {key} for {roku_ip}")
+        return {"success": True, "suppressed": "duplicate", "ms": 0.0}
+    if decision == "fold":
+        return {"success": True, "suppressed": "folded", "ms": 0.0}
+    result = dispatch_command(roku_ip, key=key)  # never raises, so the slot below is always released
+    presses = 1
+    while key in REPEATABLE_KEYS:
+        folded = finish_press(client, roku_ip, key)
+        if not folded:
+            break
+        if result["success"]:  # presses folded into a failed one are dropped with it
+            sent = send_key_sequence(roku_ip, [key] * folded, pace_ms=DEBOUNCE_FOLD_PACE_MS)
+            presses += sum(1 for r in sent if r["success"])
+    if presses > 1:
+        result["presses"] = presses
+    return result
+
+def _read_ecp_response(fp):
+    """Read one HTTP response from a buffered socket file; returns (status, connection_will_close)"""
+    status_line = fp.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by device")
+    status = int(status_line.split()[1])
+    length, will_close = 0, status_line.startswith(b"HTTP/1.0")
+    while True:
+        line = fp.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection":
+            will_close = value == "close"
+    if length:
+        fp.read(length)
+    return status, will_close
+
+def send_key_sequence(roku_ip, keys, pace_ms=TEXT_INPUT_PACE_MS):
+    """Send many keypresses as a pipelined stream over one persistent connection.
+
+    Requests are written every pace_ms without waiting for the previous response, while a reader
+    thread collects the responses in order. If the device closes the connection part-way, the keys
+    it never answered are sent again one at a time. Returns a list of {key, success, status, ms}.
+    """
+    results = [None] * len(keys)
+    sent_at = [None] * len(keys)
+    if APP_CHANGING_KEYS.intersection(keys):
+        forget_active_app(roku_ip)
+    try:
+        sock = socket.create_connection((roku_ip, 8060), timeout=5)
+    except Exception as e:
+        logger.error(f"Could not open connection to {roku_ip}: {e}")
+        return [{"key": k, "success": False, "error": str(e)} for k in keys]
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    fp = sock.makefile("rb")
+
+    def reader():
+        for i, key in enumerate(keys):
+            try:
+                status, will_close = _read_ecp_response(fp)
+            except Exception:
+                return
+            results[i] = {"key": key, "success": status == 200, "status": status,
+                          "ms": round((time.monotonic() - sent_at[i]) * 1000, 1)}
+            if will_close:
+                return
+
+    reader_thread = threading.Thread(target=reader, name=f"keys-{roku_ip}", daemon=True)
+    reader_thread.start()
+    start = time.monotonic()
+    try:
+        for i, key in enumerate(keys):
+            _sleep_until(start + i * pace_ms / 1000)
+            sent_at[i] = time.monotonic()
+            # Lit_ keys arrive percent-encoded already; anything else unsafe in a request line is encoded here
+            sock.sendall(f"POST /keypress/{quote(key, safe='%')} HTTP/1.1\r\nHost: {roku_ip}:8060\r\n"
+                         f"Content-Length: 0\r\n\r\n".encode("ascii"))
+    except OSError as e:
+        logger.warning(f"Pipelined keypresses to {roku_ip} interrupted: {e}")
+    reader_thread.join(timeout=5)
+    fp.close()
+    sock.close()
+
+    # Anything the device never answered goes out again on its own connection
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            results[i] = dispatch_command(roku_ip, key=key)
+            results[i]["key"] = key
+    poke_device(roku_ip)
+    return results
+
+def literal_keys(text):
+    """Map a string to ECP Lit_ keys, URL-encoding each character"""
+    return [f"Lit_{quote(ch, safe='')}" for ch in text]
+
+_keyboard_paths = {}  # (layout, start cell) -> {cell: (Up/Down/Left/Right moves)} from BFS
+
+def _keyboard_cells(layout):
+    return {(r, c): cell for r, row in enumerate(layout["rows"]) for c, cell in enumerate(row) if cell is not None}
+
+def _keyboard_moves_from(layout_name, start):
+    """Breadth-first search over a keyboard grid from one cell, honouring wraparound"""
+    cached = _keyboard_paths.get((layout_name, start))
+    if cached is not None:
+        return cached
+    layout = KEYBOARD_LAYOUTS[layout_name]
+    rows = layout["rows"]
+    cells = _keyboard_cells(layout)
+    height = len(rows)
+
+    def step(r, c, key):
+        if key in ("Left", "Right"):
+            width = len(rows[r])
+            c += -1 if key == "Left" else 1
+            if not 0 <= c < width:
+                if not layout["wrap"]:
+                    return None
+                c %= width
+            # Skip over gaps in the row
+            while (r, c) not in cells:
+                c += -1 if key == "Left" else 1
+                if not 0 <= c < width:
+                    if not layout["wrap"]:
+                        return None
+                    c %= width
+        else:
+            r += -1 if key == "Up" else 1
+            if not 0 <= r < height:
+                if not layout["wrap"]:
+                    return None
+                r %= height
+            c = min(c, len(rows[r]) - 1)
+            # Landing on a gap moves to the nearest key on the left, as the on-screen keyboards do
+            while c > 0 and (r, c) not in cells:
+                c -= 1
+            if (r, c) not in cells:
+                return None
+        return r, c
+
+    paths = {start: ()}
+    queue = [start]
+    for pos in queue:
+        for key in ("Up", "Down", "Left", "Right"):
+            nxt = step(*pos, key)
+            if nxt is not None and nxt not in paths:
+                paths[nxt] = paths[pos] + (key,)
+                queue.append(nxt)
+    _keyboard_paths[(layout_name, start)] = paths
+    return paths
+
+def plan_keyboard_keys(text, layout_name):
+    """Compute the shortest Up/Down/Left/Right/Select sequence to type text on an on-screen keyboard.
+
+    Each character goes to whichever matching cell is cheapest to reach from the current cursor position.
+    Raises ValueError for an unknown layout or a character the layout does not have.
+    """
+    if layout_name not in KEYBOARD_LAYOUTS:
+        raise ValueError(f"Unknown keyboard layout: {layout_name}")
+    layout = KEYBOARD_LAYOUTS[layout_name]
+    cells = _keyboard_cells(layout)
+    by_char = {}
+    for pos, cell in cells.items():
+        by_char.setdefault(cell, []).append(pos)
+
+    keys = []
+    cursor = tuple(layout["start"])
+    for ch in text:
+        targets = by_char.get(ch) or by_char.get(ch.lower())
+        if not targets:
+            raise ValueError(f"Keyboard layout {layout_name} has no key for {ch!r}")
+        paths = _keyboard_moves_from(layout_name, cursor)
+        reachable = [t for t in targets if t in paths]
+        if not reachable:
+            raise ValueError(f"Key {ch!r} cannot be reached on keyboard layout {layout_name}")
+        cursor = min(reachable, key=lambda t: len(paths[t]))
+        keys.extend(paths[cursor])
+        keys.append("Select")
+    return keys
+
+_holds = {}  # (roku_ip, key) -> hold state for keys currently held down
+_holds_lock = threading.Lock()
+
+def _hold_loop(roku_ip, key, hold):
+    """Keep a key held until released, the client stops renewing, or HOLD_MAX_SECONDS passes"""
+    repeat = key in HOLD_REPEAT_KEYS
+    interval = 1 / HOLD_REPEAT_RATE if repeat else 0.1
+    try:
+        if not repeat:
+            ecp_post(roku_ip, f"keydown/{key}")
+        while True:
+            if repeat:
+                ecp_post(roku_ip, f"keypress/{key}")
+            if hold["stop"].wait(interval):
+                break
+            now = time.monotonic()
+            if now - hold["renewed"] > HOLD_SAFETY_TIMEOUT:
+                logger.warning(f"Releasing {key} on {roku_ip}: client stopped renewing the hold")
+                break
+            if now - hold["started"] > HOLD_MAX_SECONDS:
+                logger.warning(f"Releasing {key} on {roku_ip}: held longer than {HOLD_MAX_SECONDS}s")
+                break
+    except Exception as e:
+        logger.error(f"Error holding {key} on {roku_ip}: {e}")
+    finally:
+        if not repeat:
+            try:
+                ecp_post(roku_ip, f"keyup/{key}")
+            except Exception as e:
+                logger.error(f"Error releasing {key} on {roku_ip}: {e}")
+        with _holds_lock:
+            if _holds.get((roku_ip, key)) is hold:
+                del _holds[(roku_ip, key)]
+
+def start_hold(roku_ip, key):
+    """Press and hold a key, or renew an existing hold; returns True if a new hold was started"""
+    now = time.monotonic()
+    with _holds_lock:
+        hold = _holds.get((roku_ip, key))
+        if hold is not None:
+            hold["renewed"] = now
+            return False
+        hold = {"stop": threading.Event(), "started": now, "renewed": now}
+        hold["thread"] = threading.Thread(target=_hold_loop, args=(roku_ip, key, hold),
+                                          name=f"hold-{roku_ip}-{key}", daemon=True)
+        _holds[(roku_ip, key)] = hold
+    hold["thread"].start()
+    return True
+
+def stop_hold(roku_ip, key):
+    """Release a held key and wait for the keyup to go out; returns False if it was not held"""
+    with _holds_lock:
+        hold = _holds.pop((roku_ip, key), None)
+    if hold is None:
+        return False
+    hold["stop"].set()
+    hold["thread"].join(timeout=5)
+    return True
+
+def parse_seek_target(value, position):
+    """Turn "1:23:45", "90", "+30" or "-10" into an absolute position in seconds"""
+    value = value.strip()
+    relative = value[:1] in ("+", "-")
+    sign = -1 if value.startswith("-") else 1
+    parts = value.lstrip("+-").split(":")
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"Invalid timestamp: {value}")
+    seconds = 0.0
+    for part in parts:
+        number = float(part)
+        if not math.isfinite(number) or number < 0:  # nan or inf would reach the JSON reply as NaN/Infinity
+            raise ValueError(f"Invalid timestamp: {value}")
+        seconds = seconds * 60 + number
+    return position + sign * seconds if relative else seconds
+
+def seek_to(roku_ip, target):
+    """Closed-loop seek: drive trick play from /query/media-player until within SEEK_TOLERANCE.
+
+    Far jumps press Fwd/Rev enough times to reach a useful speed, watch the position converge, and press
+    Play just before the target, predicting the overrun from the measured speed and the device latency.
+    Short backward jumps use InstantReplay. Each round re-reads the position and corrects what is left.
+    """
+    calls = 0
+
+    def press(key):
+        nonlocal calls
+        calls += 1
+        started = time.monotonic()
+        ecp_post(roku_ip, f"keypress/{key}")
+        return time.monotonic() - started
+
+    def read():
+        nonlocal calls
+        calls += 1
+        return get_media_player(roku_ip)
+
+    player = read()
+    if player["state"] not in ("play", "pause") or player["position"] is None:
+        return {"success": False, "error": f"Nothing is playing (state: {player['state']})", "ecp_calls": calls}
+    if player["is_live"]:
+        return {"success": False, "error": "Cannot seek in a live stream", "ecp_calls": calls}
+    if player["duration"]:
+        target = min(max(target, 0), max(player["duration"] - SEEK_TOLERANCE, 0))
+    position = player["position"]
+
+    rounds = 0
+    stalled = False
+    budget_end = time.monotonic() + SEEK_TIME_BUDGET
+    while (abs(target - position) > SEEK_TOLERANCE and rounds < SEEK_MAX_ROUNDS and not stalled
+           and time.monotonic() < budget_end):
+        rounds += 1
+        delta = target - position
+        before = position
+        if -SEEK_REPLAY_RANGE <= delta < 0:
+            press("InstantReplay")
+            time.sleep(SEEK_POLL_INTERVAL)
+        else:
+            presses = next(n for limit, n in SEEK_SPEED_STEPS if abs(delta) <= limit)
+            latency = 0.0
+            for _ in range(presses):
+                latency = max(latency, press("Fwd" if delta > 0 else "Rev"))
+            last_position, last_time = position, time.monotonic()
+            deadline = min(last_time + 10 + abs(delta) / 10, budget_end)
+            slow_polls = 0
+            wait = SEEK_POLL_INTERVAL
+            while time.monotonic() < deadline:
+                time.sleep(max(min(wait, deadline - time.monotonic()), 0))
+                now, position = time.monotonic(), read()["position"]
+                if position is None:
+                    break
+                speed = (position - last_position) / max(now - last_time, 1e-3)
+                last_position, last_time = position, now
+                remaining = target - position
+                # Stop once the target is passed or will be before the next poll and the Play press land
+                if remaining * delta <= 0 or abs(remaining) <= abs(speed) * (SEEK_POLL_INTERVAL + latency):
+                    break
+                # A channel that ignores Fwd/Rev keeps playing at normal speed (or stands still)
+                slow_polls = slow_polls + 1 if speed * (1 if delta > 0 else -1) < SEEK_MIN_SPEED else 0
+                if slow_polls >= SEEK_STALL_POLLS:
+                    stalled = True
+                    break
+                # Poll sparsely while far away: sleep through half of the estimated time left
+                wait = SEEK_POLL_INTERVAL
+                if speed * delta > 0 and not slow_polls:
+                    wait = min(max(abs(remaining / speed) / 2, SEEK_POLL_INTERVAL), 5)
+            press("Play")
+            time.sleep(SEEK_POLL_INTERVAL)
+        player = read()
+        if player["position"] is None:
+            break
+        position = player["position"]
+        # A round that got no closer will not be helped by another
+        if abs(target - position) >= abs(target - before):
+            stalled = True
+
+    error = position - target
+    result = {"success": abs(error) <= SEEK_TOLERANCE, "target": round(target, 1), "position": round(position, 1),
+              "error_s": round(error, 1), "rounds": rounds, "ecp_calls": calls}
+    if not result["success"] and stalled:
+        result["error"] = "Position is not moving toward the target; this channel may not support trick play"
+    elif not result["success"] and time.monotonic() >= budget_end:
+        result["error"] = f"Seek did not land within {SEEK_TIME_BUDGET}s"
+    return result
+
+_app_catalogs = {}  # roku_ip -> (list of apps, fetched_at)
+_app_catalog_refreshing = set()
+_app_catalog_failed = {}  # roku_ip -> when the first /query/apps last failed
+_app_catalog_lock = threading.Lock()
+
+def fetch_app_list(roku_ip, timeout=3):
+    """Query /query/apps and return [{id, name, type, version}, ...]"""
+    resp = requests.get(f"http://{roku_ip}:8060/query/apps", timeout=timeout)
+    resp.raise_for_status()
+    return [{"id": a.get("id"), "name": (a.text or "").strip(), "type": a.get("type", "appl"),
+             "version": a.get("version", "")}
+            for a in ET.fromstring(resp.content).findall("app")]
+
+def _revalidate_app_catalog(roku_ip):
+    try:
+        apps = fetch_app_list(roku_ip)
+        with _app_catalog_lock:
+            _app_catalogs[roku_ip] = (apps, time.monotonic())
+    except Exception as e:
+        logger.warning(f"Could not refresh app list for {roku_ip}: {e}")
+    finally:
+        with _app_catalog_lock:
+            _app_catalog_refreshing.discard(roku_ip)
+
+def get_app_catalog(roku_ip):
+    """Return the device's installed apps, serving the cached list and revalidating it in the background.
+
+    Only the first request for a device waits on /query/apps; None if that fails, and for PROBE_RETRY_AFTER
+    after it without asking again.
+    """
+    with _app_catalog_lock:
+        cached = _app_catalogs.get(roku_ip)
+        stale = cached is not None and time.monotonic() - cached[1] > APP_CATALOG_TTL
+        if stale and roku_ip not in _app_catalog_refreshing:
+            _app_catalog_refreshing.add(roku_ip)
+            threading.Thread(target=_revalidate_app_catalog, args=(roku_ip,), daemon=True).start()
+        failed_at = _app_catalog_failed.get(roku_ip)
+    if cached is not None:
+        return cached[0]
+    if failed_at is not None and time.monotonic() - failed_at < PROBE_RETRY_AFTER:
+        return None
+    try:
+        apps = fetch_app_list(roku_ip)
+    except Exception as e:
+        logger.error(f"Could not fetch app list for {roku_ip}: {e}")
+        with _app_catalog_lock:
+            _app_catalog_failed[roku_ip] = time.monotonic()
+        return None
+    with _app_catalog_lock:
+        _app_catalogs[roku_ip] = (apps, time.monotonic())
+        _app_catalog_failed.pop(roku_ip, None)
+    return apps
+
+def icon_url(app):
+    """Versioned icon URL, so browsers can cache it for good and still pick up a new icon after an app update"""
+    return f"/icon/{app['id']}?v={quote(app.get('version') or '0', safe='')}"
+
+_icon_memory = OrderedDict()  # (app_id, version) -> (bytes, content_type, etag), least recently used first
+_icon_memory_bytes = 0
+_icon_lock = threading.Lock()
+
+def _icon_remember(key, entry):
+    """Add an icon to the in-memory LRU, evicting the least recently used ones over budget"""
+    global _icon_memory_bytes
+    with _icon_lock:
+        if key in _icon_memory:
+            _icon_memory.move_to_end(key)
+            return
+        _icon_memory[key] = entry
+        _icon_memory_bytes += len(entry[0])
+        while _icon_memory_bytes > ICON_CACHE_MEMORY_BYTES and len(_icon_memory) > 1:
+            _, (data, _, _) = _icon_memory.popitem(last=False)
+            _icon_memory_bytes -= len(data)
+
+def _icon_disk_path(key):
+    app_id, version = key
+    return os.path.join(ICON_CACHE_DIR, re.sub(r"[^\w.-]", "_", f"{app_id}-{version}"))
+
+def _icon_disk_trim():
+    """Delete the least recently used icon files until the directory fits ICON_CACHE_DISK_BYTES"""
+    try:
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(ICON_CACHE_DIR) if e.is_file()]
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= ICON_CACHE_DISK_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def get_app_icon(roku_ip, app_id, version):
+    """Return (bytes, content_type, etag) for an app icon from memory, disk, or the device"""
+    key = (app_id, version)
+    with _icon_lock:
+        entry = _icon_memory.get(key)
+        if entry is not None:
+            _icon_memory.move_to_end(key)
+            return entry
+
+    path = _icon_disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # Disk LRU order is by modification time
+        content_type = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+    except OSError:
+        resp = requests.get(f"http://{roku_ip}:8060/query/icon/{app_id}", timeout=5)
+        resp.raise_for_status()
+        data = resp.content
+        content_type = resp.headers.get("Content-Type", "image/png")
+        try:
+            os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            _icon_disk_trim()
+        except OSError as e:
+            logger.warning(f"Could not write icon cache file {path}: {e}")
+
+    entry = (data, content_type, hashlib.sha1(data).hexdigest()[:20])
+    _icon_remember(key, entry)
+    return entry
+
+_broadcast_pool = ThreadPoolExecutor(max_workers=BROADCAST_MAX_WORKERS, thread_name_prefix="broadcast")
+
+def broadcast_command(roku_ips, key=None, app_id=None, wake=True):
+    """Dispatch the same command to many devices in parallel and return {ip: result}"""
+    futures = {ip: _broadcast_pool.submit(dispatch_command, ip, key, app_id, wake) for ip in roku_ips}
+    return {ip: future.result() for ip, future in futures.items()}
+
+_sync_latency = {}  # Smoothed one-way latency estimate per device, in seconds
+_sync_latency_lock = threading.Lock()
+
+def _sleep_until(deadline, spin=False):
+    """Sleep until a time.monotonic() deadline; with spin, busy-wait the final SYNC_SPIN_MS for precision.
+
+    The busy-wait never yields, so in async mode it would stall every other greenlet; it is skipped there.
+    """
+    spin = SYNC_SPIN_MS / 1000 if spin and not ASYNC_MODE else 0.0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > spin:
+            time.sleep(remaining - spin)
+
+def _prepare_synchronized(roku_ip, path, key):
+    """Check the device can act on key, pre-open a connection and buffer the request; returns (conn, error)"""
+    error = unsupported_key_error(roku_ip, key) if key else None
+    if error:
+        return None, error
+    conn = http.client.HTTPConnection(roku_ip, 8060, timeout=5)
+    try:
+        conn.connect()
+        conn.putrequest("POST", f"/{path}", skip_accept_encoding=True)
+        conn.putheader("Content-Length", "0")
+    except Exception as e:
+        logger.error(f"Could not prepare synchronized {path} for {roku_ip}: {e}")
+        conn.close()
+        return None, str(e)
+    return conn, None
+
+def _collect_synchronized(roku_ip, path, conn, sent_at, deadline):
+    """Read the reply to a released request and update the device's latency estimate"""
+    try:
+        resp = conn.getresponse()
+        resp.read()
+        rtt = time.monotonic() - sent_at
+    except Exception as e:
+        logger.error(f"Synchronized {path} failed for {roku_ip}: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+    with _sync_latency_lock:
+        previous = _sync_latency.get(roku_ip)
+        _sync_latency[roku_ip] = rtt / 2 if previous is None else 0.7 * previous + 0.3 * rtt / 2
+    return {
+        "success": resp.status in [200, 204],
+        "status": resp.status,
+        "release_ms": round((sent_at - deadline) * 1000, 3),
+        "arrival_ms": round((sent_at + rtt / 2 - deadline) * 1000, 3),
+        "rtt_ms": round(rtt * 1000, 2),
+    }
+
+def synchronized_dispatch(roku_ips, key=None, app_id=None, lead_ms=SYNC_LEAD_MS):
+    """Release the same command to many devices at one monotonic deadline.
+
+    Connections are opened and requests prepared ahead of the deadline on the broadcast pool, so at most
+    BROADCAST_MAX_WORKERS devices are contacted at once. One thread then flushes every buffered request in
+    release order; devices with a higher measured one-way latency are released slightly earlier so the
+    commands land together. The per-device release and estimated arrival offsets from the deadline are
+    reported as skew.
+    """
+    path = f"keypress/{key}" if key else f"launch/{app_id}"
+    deadline = time.monotonic() + lead_ms / 1000
+    with _sync_latency_lock:
+        latency = {ip: _sync_latency.get(ip, 0.0) for ip in roku_ips}
+    baseline = min(latency.values(), default=0.0)
+
+    results = {}
+    armed = []
+    prepared = {ip: _broadcast_pool.submit(_prepare_synchronized, ip, path, key) for ip in roku_ips}
+    for ip, future in prepared.items():
+        conn, error = future.result()
+        if error:
+            results[ip] = {"success": False, "error": error}
+        else:
+            armed.append((deadline - (latency[ip] - baseline), ip, conn))
+
+    sent = {}
+    for release_at, ip, conn in sorted(armed, key=lambda a: a[0]):
+        _sleep_until(release_at, spin=True)
+        sent_at = time.monotonic()
+        try:
+            conn.endheaders()  # Headers are buffered until here, so this is the actual send
+        except Exception as e:
+            logger.error(f"Synchronized {path} failed for {ip}: {e}")
+            results[ip] = {"success": False, "error": str(e)}
+            conn.close()
+            continue
+        sent[ip] = (conn, sent_at)
+    # Replies are read once every request is out, so reading does not compete with the release
+    collected = {ip: _broadcast_pool.submit(_collect_synchronized, ip, path, conn, sent_at, deadline)
+                 for ip, (conn, sent_at) in sent.items()}
+    for ip, future in collected.items():
+        results[ip] = future.result()
+
+    arrivals = [r["arrival_ms"] for r in results.values() if "arrival_ms" in r]
+    summary = {
+        "deadline_lead_ms": lead_ms,
+        "max_release_ms": max((abs(r["release_ms"]) for r in results.values() if "release_ms" in r), default=None),
+        "arrival_spread_ms": round(max(arrivals) - min(arrivals), 3) if arrivals else None,
+    }
+    return {ip: results[ip] for ip in roku_ips}, summary
+
+_macros_lock = threading.Lock()
+_macros_mtime = None
+
+def load_macros():
+    """Load saved macros from MACROS_FILE"""
+    global _macros_mtime
+    try:
+        # Noted before reading, so a broken file is reported once rather than on every request
+        _macros_mtime = os.path.getmtime(MACROS_FILE)
+        with open(MACROS_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        _macros_mtime = None
+        return {}
+    except Exception as e:
+        logger.error(f"Could not load macros from {MACROS_FILE}: {e}")
+        return {}
+
+def save_macros():
+    """Write the macro table to MACROS_FILE atomically; caller holds _macros_lock"""
+    global _macros_mtime
+    tmp_path = MACROS_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(macros, f, indent=2)
+    os.replace(tmp_path, MACROS_FILE)
+    _macros_mtime = os.path.getmtime(MACROS_FILE)
+
+def _reload_macros_if_changed(force=False):
+    """Pick up macros another worker process saved; caller holds _macros_lock"""
+    try:
+        mtime = os.path.getmtime(MACROS_FILE)
+    except OSError:
+        mtime = None
+    if force or mtime != _macros_mtime:
+        loaded = load_macros()
+        macros.clear()
+        macros.update(loaded)
+
+def get_macro(name):
+    """Steps of a saved macro, or None, as currently on disk"""
+    with _macros_lock:
+        _reload_macros_if_changed()
+        return macros.get(name)
+
+def macro_names():
+    with _macros_lock:
+        _reload_macros_if_changed()
+        return sorted(macros)
+
+@contextlib.contextmanager
+def _editing_macros():
+    """Read-modify-write the macro table, locked across worker processes where fcntl is available"""
+    with _macros_lock:
+        lock_file = open(MACROS_FILE + ".lock", "w") if fcntl is not None else None
+        try:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _reload_macros_if_changed(force=True)
+            yield macros
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+macros = load_macros()
+
+ECP_KEY_NAME = re.compile(r"[A-Za-z0-9_.%-]{1,64}")  # Key names, including percent-encoded Lit_ characters
+APP_ID_NAME = re.compile(r"[A-Za-z0-9_.:-]{1,64}")
+
+def check_key_name(key, where):
+    """Raise ValueError unless key is a plausible ECP key name"""
+    if not isinstance(key, str) or not ECP_KEY_NAME.fullmatch(key):
+        raise ValueError(f"{where}: key must be an ECP key name such as Down or Lit_a")
+
+def check_app_id(app_id, where):
+    """Raise ValueError unless app_id is a string or integer app id; returns it as a string"""
+    if isinstance(app_id, bool) or not isinstance(app_id, (str, int)) or not APP_ID_NAME.fullmatch(str(app_id)):
+        raise ValueError(f"{where}: app id must be a string or integer such as 837")
+    return str(app_id)
+
+def validate_macro(steps):
+    """Check a macro's step list, raising ValueError on the first bad step.
+
+    Each step is one of {"key": "Down", "repeat": 3}, {"launch": "837"} or {"delay": 500} (milliseconds);
+    key and launch steps may carry "gap" to override MACRO_STEP_GAP_MS after them.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("A macro needs a non-empty list of steps")
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ValueError(f"Step {i} must be an object")
+        kinds = [k for k in ("key", "launch", "delay") if k in step]
+        if len(kinds) != 1:
+            raise ValueError(f"Step {i} must have exactly one of key, launch or delay")
+        for field in ("delay", "gap"):
+            if field in step and (not isinstance(step[field], (int, float)) or isinstance(step[field], bool)
+                                  or not 0 <= step[field] <= MACRO_MAX_DELAY_MS):
+                raise ValueError(f"Step {i}: {field} must be between 0 and {MACRO_MAX_DELAY_MS} milliseconds")
+        if "repeat" in step and (not isinstance(step["repeat"], int) or not 1 <= step["repeat"] <= 100):
+            raise ValueError(f"Step {i}: repeat must be an integer between 1 and 100")
+        if "key" in step:
+            check_key_name(step["key"], f"Step {i}")
+        if "launch" in step:
+            step["launch"] = check_app_id(step["launch"], f"Step {i}")
+
+def run_macro(roku_ip, steps, stop_on_error=True):
+    """Run a macro's steps against a device on a drift-free timer.
+
+    Each step is scheduled at a fixed offset from the start of the run, so slow requests do not push
+    later steps back by more than their own overrun. Returns a list of per-step results with latency
+    and how late the step started.
+    """
+    results = []
+    start = time.monotonic()
+    due = start
+    for step in steps:
+        if "delay" in step:
+            due += step["delay"] / 1000
+            continue
+        gap = step.get("gap", MACRO_STEP_GAP_MS) / 1000
+        for _ in range(step.get("repeat", 1)):
+            _sleep_until(due)
+            began = time.monotonic()
+            if "key" in step:
+                result = dispatch_command(roku_ip, key=step["key"])
+                action = f"key {step['key']}"
+            else:
+                result = dispatch_command(roku_ip, app_id=step["launch"])
+                action = f"launch {step['launch']}"
+            result.update(action=action, offset_ms=round((began - start) * 1000, 1),
+                          late_ms=round((began - due) * 1000, 1))
+            results.append(result)
+            if not result["success"] and stop_on_error:
+                return results
+            if "launch" in step:
+                # A launch may include a wake-up; space the next step from when it finished
+                due = max(due, time.monotonic())
+            due += gap
+    return results
+
+def validate_batch(commands):
+    """Check an API v2 command batch, raising ValueError on the first bad command.
+
+    Commands use the macro step vocabulary plus text entry: {"key": "Down", "repeat": 3},
+    {"launch": "837", "params": {"contentId": "..."}}, {"text": "star trek", "layout": "youtube"}
+    or {"delay": 500} (milliseconds).
+    """
+    if not isinstance(commands, list) or not commands:
+        raise ValueError("A batch needs a non-empty list of commands")
+    if len(commands) > BATCH_MAX_COMMANDS:
+        raise ValueError(f"A batch is limited to {BATCH_MAX_COMMANDS} commands")
+    for i, cmd in enumerate(commands):
+        if not isinstance(cmd, dict):
+            raise ValueError(f"Command {i} must be an object")
+        kinds = [k for k in ("key", "launch", "text", "delay") if k in cmd]
+        if len(kinds) != 1:
+            raise ValueError(f"Command {i} must have exactly one of key, launch, text or delay")
+        if "delay" in cmd and (not isinstance(cmd["delay"], (int, float))
+                               or not 0 <= cmd["delay"] <= BATCH_MAX_DELAY_MS):
+            raise ValueError(f"Command {i}: delay must be between 0 and {BATCH_MAX_DELAY_MS} milliseconds")
+        if "repeat" in cmd and (not isinstance(cmd["repeat"], int) or not 1 <= cmd["repeat"] <= 100):
+            raise ValueError(f"Command {i}: repeat must be an integer between 1 and 100")
+        if "key" in cmd:
+            check_key_name(cmd["key"], f"Command {i}")
+        if "launch" in cmd:
+            cmd["launch"] = check_app_id(cmd["launch"], f"Command {i}")
+        if "params" in cmd and (not isinstance(cmd["params"], dict) or not all(
+                isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in cmd["params"].values())):
+            raise ValueError(f"Command {i}: params must be an object of strings or numbers")
+        if "text" in cmd:
+            if not isinstance(cmd["text"], str) or not 0 < len(cmd["text"]) <= TEXT_INPUT_MAX_CHARS:
+                raise ValueError(f"Command {i}: text must be 1 to {TEXT_INPUT_MAX_CHARS} characters")
+            layout = cmd.get("layout", "direct")
+            if layout != "direct" and layout not in KEYBOARD_LAYOUTS:
+                raise ValueError(f"Command {i}: unknown keyboard layout {layout}")
+
+def run_batch(roku_ip, commands, stop_on_error=False, wake=True, pace_ms=BATCH_KEY_PACE_MS):
+    """Run a validated command batch against one device, returning one compact result per command.
+
+    Consecutive key commands are sent as one pipelined stream paced pace_ms apart, so a run of
+    navigation keys costs one connection rather than a round trip each. Results are
+    {"ok": bool, "ms": float} plus "error", "presses" or "outcome" where they apply; after a failure
+    with stop_on_error the remaining commands report {"ok": false, "skipped": true}.
+    """
+    results = [None] * len(commands)
+    i = 0
+    while i < len(commands):
+        cmd = commands[i]
+        if "key" in cmd:
+            # Gather the run of key commands starting here
+            run = []
+            while i < len(commands) and "key" in commands[i]:
+                error = unsupported_key_error(roku_ip, commands[i]["key"])
+                if error:
+                    break
+                run.append(i)
+                i += 1
+            if not run:
+                results[i] = {"ok": False, "ms": 0.0, "error": error}
+                i += 1
+            else:
+                keys = [commands[j]["key"] for j in run for _ in range(commands[j].get("repeat", 1))]
+                presses = iter(send_key_sequence(roku_ip, keys, pace_ms=pace_ms))
+                for j in run:
+                    sent = [next(presses) for _ in range(commands[j].get("repeat", 1))]
+                    failed = [r for r in sent if not r["success"]]
+                    results[j] = {"ok": not failed, "ms": max(r.get("ms", 0.0) for r in sent)}
+                    if len(sent) > 1:
+                        results[j]["presses"] = len(sent)
+                    if failed:
+                        results[j]["error"] = failed[0].get("error") or f"HTTP {failed[0].get('status')}"
+        else:
+            start = time.monotonic()
+            if "delay" in cmd:
+                time.sleep(cmd["delay"] / 1000)
+                result = {"ok": True}
+            elif "launch" in cmd:
+                dispatched = dispatch_command(roku_ip, app_id=cmd["launch"], wake=wake, params=cmd.get("params"))
+                result = {"ok": dispatched["success"]}
+                if "outcome" in dispatched:
+                    result["outcome"] = dispatched["outcome"]
+                if not dispatched["success"]:
+                    result["error"] = dispatched.get("error") or f"HTTP {dispatched.get('status')}"
+            else:
+                layout = cmd.get("layout", "direct")
+                if layout == "direct":
+                    keys, text_pace = literal_keys(cmd["text"]), TEXT_INPUT_PACE_MS
+                else:
+                    try:
+                        keys, text_pace = plan_keyboard_keys(cmd["text"], layout), KEYBOARD_PACE_MS
+                    except ValueError as e:
+                        keys, result = None, {"ok": False, "error": str(e)}
+                if keys is not None:
+                    failed = [r for r in send_key_sequence(roku_ip, keys, pace_ms=text_pace) if not r["success"]]
+                    result = {"ok": not failed, "presses": len(keys)}
+                    if failed:
+                        result["error"] = f"{len(failed)} of {len(keys)} presses failed"
+            result["ms"] = round((time.monotonic() - start) * 1000, 1)
+            results[i] = result
+            i += 1
+        if stop_on_error and any(r is not None and not r["ok"] for r in results[:i]):
+            for j in range(i, len(commands)):
+                results[j] = {"ok": False, "skipped": True}
+            break
+    return results
+
+def check_device_set(devices, group):
+    """Raise ValueError unless devices and group have the shapes resolve_device_set accepts"""
+    if devices is not None and not isinstance(devices, str) and not (
+            isinstance(devices, list) and all(isinstance(d, str) for d in devices)):
+        raise ValueError("devices must be a comma-separated string or a list of device ids or IPs")
+    if group is not None and not isinstance(group, str):
+        raise ValueError("group must be a group name")
+
+def resolve_device_set(devices=None, group=None):
+    """Turn an explicit device list (ids or IPs) and/or group name into a de-duplicated list of IPs"""
+    ips = []
+    with _registry_lock:
+        if group == "all":
+            ips.extend(_devices[i]["ip"] for i in _device_index["order"])
+        elif group:
+            if group not in _device_index["group"]:
+                raise KeyError(group)
+            ips.extend(_devices[i]["ip"] for i in _device_index["group"][group])
+    if devices:
+        if isinstance(devices, str):
+            devices = devices.split(",")
+        for d in devices:
+            d = d.strip()
+            if d:
+                device = find_device(d)
+                ips.append(device["ip"] if device else d)
+    return list(dict.fromkeys(ips))
+
+CRON_ALIASES = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@midnight": "0 0 * * *",
+                "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *", "@yearly": "0 0 1 1 *"}
+
+def parse_cron(spec):
+    """Parse a five-field cron spec (minute hour day-of-month month day-of-week) into sets of allowed values.
+
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/10, 8-18/2); day-of-week 0 and 7 are Sunday.
+    """
+    fields = CRON_ALIASES.get(spec.strip(), spec).split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron spec needs 5 fields: {spec!r}")
+    bounds = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    parsed = []
+    for field, (low, high) in zip(fields, bounds):
+        values = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            if base == "*":
+                first, last = low, high
+            elif "-" in base:
+                first, last = (int(x) for x in base.split("-", 1))
+            else:
+                first = last = int(base)
+                if step:
+                    last = high
+            step = int(step) if step else 1
+            if not low <= first <= last <= high or step < 1:
+                raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+            values.update(range(first, last + 1, step))
+        parsed.append(values)
+    if 7 in parsed[4]:
+        parsed[4] = (parsed[4] - {7}) | {0}
+    # Standard cron: when both day fields are restricted, a day matching either one qualifies
+    parsed.append((fields[2] != "*", fields[4] != "*"))
+    return parsed
+
+def cron_next(cron, after):
+    """Return the first datetime strictly after `after` (naive local time) matching a parsed cron spec"""
+    minutes, hours, days, months, weekdays, (dom_set, dow_set) = cron
+    hours, minutes = sorted(hours), sorted(minutes)
+    t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    for _ in range(366 * 8):  # Long enough to reach any valid day, including Feb 29 on a given weekday
+        weekday = (t.weekday() + 1) % 7  # cron counts from Sunday
+        if dom_set and dow_set:
+            day_ok = t.day in days or weekday in weekdays
+        else:
+            day_ok = t.day in days and weekday in weekdays
+        if t.month in months and day_ok:
+            for h in hours:
+                if h < t.hour:
+                    continue
+                for m in minutes:
+                    if h == t.hour and m < t.minute:
+                        continue
+                    return t.replace(hour=h, minute=m)
+        t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+    raise ValueError("Cron spec never matches")
+
+def validate_schedule_entry(entry):
+    """Check a schedule entry, raising ValueError if it is malformed"""
+    if not isinstance(entry, dict):
+        raise ValueError("Entry must be a JSON object")
+    if not isinstance(entry.get("id"), str) or not re.fullmatch(r"[\w\-]{1,64}", entry["id"]):
+        raise ValueError("Entry id must be 1-64 letters, digits, '-' or '_'")
+    if ("cron" in entry) == ("at" in entry):
+        raise ValueError("Entry needs exactly one of cron or at")
+    if "cron" in entry:
+        if not isinstance(entry["cron"], str):
+            raise ValueError("cron must be a string such as '0 23 * * *'")
+        parse_cron(entry["cron"])
+    else:
+        if not isinstance(entry["at"], str):
+            raise ValueError("at must be an ISO date and time such as 2026-01-05T07:30")
+        try:
+            datetime.fromisoformat(entry["at"])
+        except ValueError:
+            raise ValueError(f"at must be an ISO date and time such as 2026-01-05T07:30, not {entry['at']!r}")
+    if sum(k in entry for k in ("key", "app_id", "macro")) != 1:
+        raise ValueError("Entry needs exactly one of key, app_id or macro")
+    if "key" in entry:
+        check_key_name(entry["key"], "Entry")
+    if "app_id" in entry:
+        entry["app_id"] = check_app_id(entry["app_id"], "Entry")
+    if "macro" in entry and (not isinstance(entry["macro"], str) or get_macro(entry["macro"]) is None):
+        raise ValueError(f"No macro named {entry['macro']}")
+    if entry.get("missed", "run") not in ("run", "skip"):
+        raise ValueError("missed must be run or skip")
+    if not isinstance(entry.get("enabled", True), bool):
+        raise ValueError("enabled must be true or false")
+    check_device_set(entry.get("devices"), entry.get("group"))
+    resolve_device_set(entry.get("devices"), entry.get("group"))  # KeyError for an unknown group
+    if not entry.get("devices") and not entry.get("group"):
+        raise ValueError("Entry needs devices or a group")
+
+schedule = {}             # entry id -> entry dict, as stored in SCHEDULE_FILE
+_schedule_heap = []       # (due timestamp, sequence, entry id, entry generation); stale items are skipped on pop
+_schedule_generation = {} # entry id -> generation, bumped whenever an entry is replaced or removed
+_schedule_seq = itertools.count()
+_schedule_cond = threading.Condition()
+_schedule_mtime = None
+_scheduler_lock_file = None
+# Entries wait on work they queue to _broadcast_pool, so they must not run on that pool themselves
+_scheduler_pool = ThreadPoolExecutor(max_workers=SCHEDULE_MAX_WORKERS, thread_name_prefix="scheduled")
+
+def _next_due(entry, now):
+    """Timestamp the entry should next run, honouring missed-run policy; None if it never runs again"""
+    if not entry.get("enabled", True):
+        return None
+    last_run = datetime.fromisoformat(entry["last_run"]) if entry.get("last_run") else None
+    if "at" in entry:
+        if last_run is not None:
+            return None
+        due = datetime.fromisoformat(entry["at"]).timestamp()
+    else:
+        cron = parse_cron(entry["cron"])
+        # Resume from the last run so a restart can see what it missed
+        base = last_run or datetime.fromtimestamp(entry.get("created", now))
+        due = cron_next(cron, base).timestamp()
+    if due >= now:
+        return due
+    if entry.get("missed", "run") == "run":
+        if "at" in entry:
+            missed_recently = now - due <= SCHEDULE_MISSED_GRACE
+        else:
+            # Look for any occurrence inside the grace window, not just the first one after the last run
+            window_start = datetime.fromtimestamp(max(due, now - SCHEDULE_MISSED_GRACE) - 60)
+            missed_recently = cron_next(cron, window_start).timestamp() <= now
+        if missed_recently:
+            return now  # Several missed runs collapse into one
+    if "at" in entry:
+        return None
+    return cron_next(cron, datetime.fromtimestamp(now)).timestamp()
+
+def _push_entry(entry_id, now):
+    """(Re)queue an entry; caller holds _schedule_cond"""
+    generation = _schedule_generation.get(entry_id, 0) + 1
+    _schedule_generation[entry_id] = generation
+    entry = schedule.get(entry_id)
+    due = _next_due(entry, now) if entry else None
+    if due is not None:
+        heapq.heappush(_schedule_heap, (due, next(_schedule_seq), entry_id, generation))
+    entry_next = datetime.fromtimestamp(due).isoformat(timespec="seconds") if due else None
+    if entry:
+        entry["next_run"] = entry_next
+
+def load_schedule():
+    """(Re)load SCHEDULE_FILE and rebuild the timer heap; caller holds _schedule_cond"""
+    global schedule, _schedule_heap, _schedule_mtime
+    try:
+        # Noted before reading, so a broken file is reported once rather than on every check
+        _schedule_mtime = os.path.getmtime(SCHEDULE_FILE)
+        with open(SCHEDULE_FILE) as f:
+            entries = json.load(f)
+        if not isinstance(entries, dict):
+            raise ValueError("expected an object of entries by id")
+    except FileNotFoundError:
+        _schedule_mtime = None
+        entries = {}
+    except Exception as e:
+        logger.error(f"Could not load schedule from {SCHEDULE_FILE}: {e}")
+        entries = {}
+    schedule = {}
+    for entry_id, entry in entries.items():
+        if not isinstance(entry, dict):
+            logger.error(f"Dropping schedule entry {entry_id}: not an object")
+            continue
+        entry["id"] = entry_id
+        schedule[entry_id] = entry
+    _schedule_heap = []
+    now = time.time()
+    for entry_id in schedule:
+        try:
+            _push_entry(entry_id, now)
+        except Exception as e:  # A hand-edited entry must not take the scheduler thread down
+            logger.error(f"Ignoring schedule entry {entry_id}: {e}")
+    heapq.heapify(_schedule_heap)
+
+def save_schedule():
+    """Write the schedule atomically; caller holds _schedule_cond"""
+    global _schedule_mtime
+    tmp_path = SCHEDULE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({k: {f: v for f, v in e.items() if f != "next_run"} for k, e in schedule.items()}, f, indent=2)
+    os.replace(tmp_path, SCHEDULE_FILE)
+    _schedule_mtime = os.path.getmtime(SCHEDULE_FILE)
+
+def _reload_schedule_if_changed():
+    """Pick up edits another worker process wrote to SCHEDULE_FILE; caller holds _schedule_cond"""
+    try:
+        changed = os.path.getmtime(SCHEDULE_FILE) != _schedule_mtime
+    except OSError:
+        return
+    if changed:
+        logger.info("Schedule file changed on disk, reloading")
+        load_schedule()
+
+def run_scheduled_action(entry):
+    """Dispatch a schedule entry through the normal command path; nothing waits on it, so failures are logged"""
+    try:
+        roku_ips = resolve_device_set(entry.get("devices"), entry.get("group"))
+        if "macro" in entry:
+            steps = get_macro(entry["macro"])
+            if steps is None:
+                logger.error(f"Scheduled entry {entry['id']} failed: no macro named {entry['macro']}")
+                return
+            futures = {ip: _broadcast_pool.submit(run_macro, ip, steps) for ip in roku_ips}
+            results = {ip: {"success": all(r["success"] for r in f.result())} for ip, f in futures.items()}
+        else:
+            results = broadcast_command(roku_ips, key=entry.get("key"), app_id=entry.get("app_id"))
+    except KeyError as e:
+        logger.error(f"Scheduled entry {entry['id']} failed: unknown group {e}")
+        return
+    except Exception as e:
+        logger.error(f"Scheduled entry {entry['id']} failed: {e}")
+        return
+    failed = [ip for ip, r in results.items() if not r["success"]]
+    if failed:
+        logger.error(f"Scheduled entry {entry['id']} failed on {', '.join(failed)}")
+    else:
+        logger.info(f"Scheduled entry {entry['id']} ran on {len(results)} device(s)")
+
+def _scheduler_loop():
+    """Sleep until the earliest due entry, run everything due, requeue; no per-tick scan of entries"""
+    with _schedule_cond:
+        while True:
+            now = time.time()
+            _reload_schedule_if_changed()
+
+            due_entries = []
+            while _schedule_heap and (_schedule_heap[0][0] <= now or
+                                      _schedule_heap[0][3] != _schedule_generation.get(_schedule_heap[0][2])):
+                _, _, entry_id, generation = heapq.heappop(_schedule_heap)
+                if generation == _schedule_generation.get(entry_id) and entry_id in schedule:
+                    due_entries.append(schedule[entry_id])
+
+            for entry in due_entries:
+                entry["last_run"] = datetime.fromtimestamp(now).isoformat(timespec="seconds")
+                _scheduler_pool.submit(run_scheduled_action, dict(entry))
+                _push_entry(entry["id"], now)
+            if due_entries:
+                save_schedule()
+
+            wait = SCHEDULE_RELOAD_CHECK
+            if _schedule_heap:
+                wait = min(max(_schedule_heap[0][0] - time.time(), 0), wait)
+            _schedule_cond.wait(wait)
+
+def start_scheduler():
+    """Start the scheduler thread, in only one process when several gunicorn workers share the schedule.
+
+    Called when the app is served rather than on import, so tools that import ChoyRoku do not run schedules.
+    """
+    global _scheduler_lock_file
+    with _schedule_cond:
+        load_schedule()
+    if fcntl is not None:
+        _scheduler_lock_file = open(SCHEDULE_FILE + ".lock", "w")
+        try:
+            fcntl.flock(_scheduler_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.info("Scheduler is running in another worker process")
+            return
+    threading.Thread(target=_scheduler_loop, name="scheduler", daemon=True).start()
+    logger.info(f"Scheduler started with {len(schedule)} entr{'y' if len(schedule) == 1 else 'ies'}")
+
+def handle_remote_message(roku_ip, msg, held, client=None):
+    """Handle one WebSocket control message and return its ack.
+
+    Messages are compact JSON: {"t": "k", "k": key} presses a key, {"t": "l", "a": app_id} launches an app,
+    {"t": "h", "k": key, "a": "d"|"u"} holds or releases a key, and {"t": "p"} is a ping. Every message may carry
+    an id "i", echoed back in the ack {"t": "a", "i": ..., "ok": 1, "rtt": ms} or {"t": "a", "i": ..., "ok": 0, "e": error}.
+    A key or launch suppressed as a duplicate tap is acked with "s": "duplicate" or "folded" and no rtt.
+    """
+    kind = msg.get("t")
+    ack = {"t": "a", "i": msg.get("i")}
+    if kind == "p":
+        return dict(ack, ok=1)
+    try:
+        if kind in ("k", "h") and msg.get("k"):
+            check_key_name(msg["k"], "Message")
+        if kind == "l" and msg.get("a"):
+            msg["a"] = check_app_id(msg["a"], "Message")
+    except ValueError as e:
+        return dict(ack, ok=0, e=str(e))
+    if kind == "k" and msg.get("k"):
+        result = debounced_key(client, roku_ip, msg["k"])
+    elif kind == "l" and msg.get("a"):
+        if admit_press(client, roku_ip, launch_press_key(msg["a"])) == "drop":
+            return dict(ack, ok=1, s="duplicate")
+        result = dispatch_command(roku_ip, app_id=msg["a"])
+    elif kind == "h" and msg.get("k") and msg.get("a") in ("d", "u"):
+        key = msg["k"]
+        if msg["a"] == "u":
+            stop_hold(roku_ip, key)
+            held.discard(key)
+            return dict(ack, ok=1)
+        error = unsupported_key_error(roku_ip, key)
+        if error:
+            return dict(ack, ok=0, e=error)
+        start_hold(roku_ip, key)
+        held.add(key)
+        return dict(ack, ok=1)
+    else:
+        return dict(ack, ok=0, e="Unknown message")
+
+    if result.get("suppressed"):
+        return dict(ack, ok=1, s=result["suppressed"])
+    if result["success"]:
+        return dict(ack, ok=1, rtt=result["ms"], **({"n": result["presses"]} if "presses" in result else {}))
+    return dict(ack, ok=0, rtt=result["ms"], e=result.get("error", f"Status {result.get('status')}"))
+
+if sock is not None:
+    @sock.route("/ws")
+    def remote_socket(ws):
+        """Long-lived control channel for one phone: key, launch and hold messages with RTT acks"""
+        roku_ip = session.get("roku_ip")
+        if not roku_ip:
+            ws.send(json.dumps({"t": "e", "e": "No Roku selected"}))
+            return
+        send_lock = threading.Lock()
+        held = set()
+        client = session.get("client") or os.urandom(8).hex()
+
+        def reply(ack):
+            with send_lock:
+                ws.send(json.dumps(ack, separators=(",", ":")))
+
+        logger.info(f"Remote channel opened for {roku_ip}")
+        try:
+            while True:
+                try:
+                    msg = json.loads(ws.receive())
+                except ValueError:
+                    reply({"t": "a", "ok": 0, "e": "Invalid JSON"})
+                    continue
+                if not isinstance(msg, dict):
+                    reply({"t": "a", "ok": 0, "e": "Message must be a JSON object"})
+                    continue
+                if msg.get("t") == "l":
+                    # Launches may wait for a TV to wake up; do not hold up keypresses behind them
+                    _broadcast_pool.submit(lambda m=msg: reply(handle_remote_message(roku_ip, m, held, client)))
+                else:
+                    reply(handle_remote_message(roku_ip, msg, held, client))
+        finally:
+            # A phone that disappears mid-hold must not leave a key stuck down
+            for key in list(held):
+                stop_hold(roku_ip, key)
+            logger.info(f"Remote channel closed for {roku_ip}")
+
+@app.after_request
+def conditional_and_compressed(resp):
+    """ETag/304 for text GETs and gzip for text bodies; streams (SSE) and images pass through untouched"""
+    if resp.direct_passthrough or resp.is_streamed or resp.mimetype not in GZIP_MIMETYPES:
+        return resp
+    if request.method in ("GET", "HEAD") and resp.status_code == 200:
+        if not resp.get_etag()[0]:
+            resp.add_etag()
+        resp.make_conditional(request)
+    resp.vary.add("Accept-Encoding")
+    if (resp.status_code != 200 or "Content-Encoding" in resp.headers
+            or "gzip" not in request.accept_encodings):
+        return resp
+    body = resp.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return resp
+    etag, _ = resp.get_etag()
+    resp.set_data(gzip_body(body, etag))
+    resp.headers["Content-Encoding"] = "gzip"
+    if etag:
+        # Same content, different bytes: a weak ETag still matches on revalidation (as nginx does)
+        resp.set_etag(etag, weak=True)
+    return resp
+
 @app.route("/", methods=["GET"])
 def index():
-    keys = ["Home", "Up", "Down", "Left", "Right", "Select", "Back", "Play", "Pause", "VolumeUp", "VolumeDown"]
-    devices = discover_rokus()
+    """Static page shell; the device list and per-device controls are filled in from /state"""
+    resp = Response(SHELL["body"], mimetype=SHELL["mimetype"])
+    resp.set_etag(SHELL["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/assets/<name>", methods=["GET"])
+def asset(name):
+    """Stylesheet and script for the shell; versioned URLs are cached for good"""
+    item = ASSETS.get(name)
+    if not item:
+        return jsonify({"error": f"Unknown asset {name}"}), 404
+    resp = Response(item["body"], mimetype=item["mimetype"])
+    resp.set_etag(item["etag"])
+    if request.args.get("v") == item["etag"]:
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/manifest.webmanifest", methods=["GET"])
+def manifest():
+    """Web app manifest, so the remote can be installed to a phone's home screen"""
+    resp = Response(MANIFEST["body"], mimetype=MANIFEST["mimetype"])
+    resp.set_etag(MANIFEST["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/sw.js", methods=["GET"])
+def service_worker():
+    """Service worker that keeps the page shell and icons on the phone; served from / so it controls the whole app"""
+    resp = Response(SERVICE_WORKER_JS["body"], mimetype=SERVICE_WORKER_JS["mimetype"])
+    resp.set_etag(SERVICE_WORKER_JS["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/state", methods=["GET"])
+def state():
+    """Session and device state behind the page: a page of devices, selection, capabilities, apps and macros"""
+    refresh_devices(force=request.args.get("refresh") == "1")
+    try:
+        offset, limit = page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    devices, total = list_devices(room=request.args.get("room"), group=request.args.get("group"),
+                                  q=request.args.get("q"), offset=offset, limit=limit)
     selected = session.get("roku_ip")
+    device = find_device(selected) if selected else None
     
-    # Test connection to selected device
+    # Reachability of the selected device is reported live by the now-playing stream, so this
+    # does not wait on a connection test
     error_message = None
-    if selected and selected not in devices:
+    if selected and not device:
         error_message = f"Selected device {selected} is no longer available"
         session.pop("roku_ip", None)
         selected = None
-    elif selected and not test_roku_connection(selected):
-        error_message = f"Cannot connect to {selected}. Please check network connection."
     
-    server_info = f"{FLASK_HOST}:{FLASK_PORT}"
-    device_count = len(devices)
+    # Unknown capabilities (device unreachable) show every control rather than hiding working ones
+    capabilities = (get_capabilities(selected) if selected else None) or {}
+    catalog = get_app_catalog(selected) if selected else None
+    if catalog:
+        apps = [{"id": app["id"], "name": app["name"], "icon": icon_url(app)}
+                for app in catalog if app["type"] == "appl"]
+    else:
+        apps = DEFAULT_APPS
     
-    return render_template_string(HTML, keys=keys, devices=devices, selected=selected, 
-                                error_message=error_message, server_info=server_info, 
-                                device_count=device_count)
+    resp = jsonify({
+        "devices": devices,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "fleet": registry_summary(),
+        "selected": selected,
+        "name": device["name"] if device else None,
+        "error": error_message,
+        "caps": capabilities,
+        "apps": apps,
+        "macros": macro_names(),
+    })
+    resp.headers["Cache-Control"] = "no-cache, private"
+    resp.vary.add("Cookie")
+    return resp
 
 @app.route("/select", methods=["POST"])
 def select():
@@ -240,11 +2766,21 @@ def select():
     if test_roku_connection(selected_ip):
         session["roku_ip"] = selected_ip
         logger.info(f"Selected Roku device: {selected_ip}")
+        if wants_json():
+            return jsonify({"success": True, "message": f"Selected {selected_ip}"}), 200
         return redirect("/")
     else:
         logger.error(f"Failed to connect to selected device: {selected_ip}")
+        if wants_json():
+            return jsonify({"error": f"Cannot connect to {selected_ip}"}), 502
         return redirect("/")
 
+def client_id():
+    """Stable id for the browser behind this request, so duplicate taps are told apart per phone"""
+    if "client" not in session:
+        session["client"] = os.urandom(8).hex()
+    return session["client"]
+
 @app.route("/send", methods=["POST"])
 def send():
     key = request.form["key"]
@@ -252,51 +2788,460 @@ def send():
     if not roku_ip:
         return jsonify({"error": "No Roku selected"}), 400
     
-    try:
-        logger.info(f"Sending key '{key}' to {roku_ip}")
-        r = requests.post(f"http://{roku_ip}:8060/keypress/{key}", timeout=5)
-        if r.status_code == 200:
-            logger.info(f"Successfully sent {key} to {roku_ip}")
-            return jsonify({"success": True, "message": f"Sent {key}"}), 200
-        else:
-            logger.error(f"Failed to send {key} to {roku_ip}. Status: {r.status_code}")
-            return jsonify({"error": f"Failed to send {key}. Status: {r.status_code}"}), 500
-    except Exception as e:
-        logger.error(f"Error sending {key} to {roku_ip}: {e}")
-        return jsonify({"error": f"Error sending {key}: {str(e)}"}), 500
+    error = unsupported_key_error(roku_ip, key)
+    if error:
+        return jsonify({"error": error, "unsupported": True}), 400
+
+    logger.info(f"Sending key '{key}' to {roku_ip}")
+    result = debounced_key(client_id(), roku_ip, key)
+    if result.get("suppressed") == "duplicate":
+        return jsonify({"success": True, "message": f"Ignored duplicate {key}", "suppressed": "duplicate"}), 200
+    if result.get("suppressed") == "folded":
+        return jsonify({"success": True, "message": f"Added to repeated {key}", "suppressed": "folded"}), 200
+    if result["success"]:
+        logger.info(f"Successfully sent {key} to {roku_ip}")
+        message = f"Sent {key}" + (f" x{result['presses']}" if result.get("presses") else "")
+        return jsonify({"success": True, "message": message, "presses": result.get("presses", 1)}), 200
+    if "error" in result:
+        logger.error(f"Error sending {key} to {roku_ip}: {result['error']}")
+        return jsonify({"error": f"Error sending {key}: {result['error']}"}), 500
+    logger.error(f"Failed to send {key} to {roku_ip}. Status: {result['status']}")
+    return jsonify({"error": f"Failed to send {key}. Status: {result['status']}"}), 500
 
 @app.route("/launch", methods=["POST"])
 def launch():
     app_id = request.form["app_id"]
+    wake = request.form.get("wake", "1") != "0"
+    params = {name: request.form[name] for name in LAUNCH_PARAMS if request.form.get(name)}
     roku_ip = session.get("roku_ip")
     if not roku_ip:
         return jsonify({"error": "No Roku selected"}), 400
+    if admit_press(client_id(), roku_ip, launch_press_key(app_id, params)) == "drop":
+        return jsonify({"success": True, "message": f"Ignored duplicate launch of {app_id}",
+                        "suppressed": "duplicate"}), 200
     
     try:
         logger.info(f"Launching app {app_id} on {roku_ip}")
-        r = requests.post(f"http://{roku_ip}:8060/launch/{app_id}", timeout=5)
-        if r.status_code in [200, 204]:
-            logger.info(f"Successfully launched app {app_id} on {roku_ip}")
+        if wake:
+            ready, launched, waited = run_when_ready(roku_ip, lambda: launch_app(roku_ip, app_id, params))
+            if ready is None:
+                return jsonify({"error": f"Cannot connect to {roku_ip}"}), 502
+            if not ready:
+                return jsonify({"error": f"{roku_ip} did not wake up within {WAKE_TIMEOUT}s"}), 504
+            if waited > 1:
+                logger.info(f"Waited {waited:.1f}s for {roku_ip} to wake before launching {app_id}")
+            status_code, outcome = launched
+        else:
+            status_code, outcome = launch_app(roku_ip, app_id, params)
+        if outcome == "skipped":
+            logger.info(f"App {app_id} is already active on {roku_ip}, not relaunching")
+            return jsonify({"success": True, "message": f"App {app_id} is already running", "skipped": True}), 200
+        if status_code in [200, 204]:
+            logger.info(f"Successfully {'deep-linked into' if outcome == 'deep-linked' else 'launched'} "
+                        f"app {app_id} on {roku_ip}")
             return jsonify({"success": True, "message": f"Launched app {app_id}"}), 200
         else:
-            logger.error(f"Failed to launch app {app_id} on {roku_ip}. Status: {r.status_code}")
-            return jsonify({"error": f"Failed to launch app {app_id}. Status: {r.status_code}"}), 500
+            logger.error(f"Failed to launch app {app_id} on {roku_ip}. Status: {status_code}")
+            return jsonify({"error": f"Failed to launch app {app_id}. Status: {status_code}"}), 500
     except Exception as e:
         logger.error(f"Error launching app {app_id} on {roku_ip}: {e}")
         return jsonify({"error": f"Error launching app {app_id}: {str(e)}"}), 500
 
+@app.route("/text", methods=["POST"])
+def send_text():
+    """Type a string on the selected Roku with pipelined Lit_ keypresses, or via an on-screen keyboard layout"""
+    data = request.get_json(silent=True) or request.form
+    text = data.get("text", "")
+    roku_ip = data.get("device") or session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+    if not isinstance(roku_ip, str):
+        return jsonify({"error": "device must be a device id or IP"}), 400
+    if not isinstance(text, str):
+        return jsonify({"error": "text must be a string"}), 400
+    if not text:
+        return jsonify({"error": "No text given"}), 400
+    if len(text) > TEXT_INPUT_MAX_CHARS:
+        return jsonify({"error": f"Text is limited to {TEXT_INPUT_MAX_CHARS} characters"}), 400
+
+    layout = data.get("layout") or "direct"
+    if not isinstance(layout, str):
+        return jsonify({"error": "layout must be a keyboard layout name"}), 400
+    if layout == "direct":
+        keys, pace_ms = literal_keys(text), TEXT_INPUT_PACE_MS
+    else:
+        try:
+            keys, pace_ms = plan_keyboard_keys(text, layout), KEYBOARD_PACE_MS
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
+    logger.info(f"Typing {len(text)} character(s) on {roku_ip} ({layout}, {len(keys)} presses)")
+    start = time.monotonic()
+    results = send_key_sequence(roku_ip, keys, pace_ms=pace_ms)
+    failed = [r["key"] for r in results if not r["success"]]
+    elapsed = round((time.monotonic() - start) * 1000, 1)
+    if failed:
+        logger.error(f"Failed to send {len(failed)} of {len(keys)} presses typing on {roku_ip}")
+        return jsonify({"error": f"Failed to send {len(failed)} of {len(keys)} presses", "ms": elapsed,
+                        "results": results}), 500
+    return jsonify({"success": True, "message": f"Typed {len(text)} characters", "presses": len(keys),
+                    "ms": elapsed}), 200
+
+@app.route("/hold", methods=["POST"])
+def hold():
+    """Press (action=down, repeat to renew) or release (action=up) a key on the selected Roku"""
+    key = request.form.get("key")
+    action = request.form.get("action")
+    roku_ip = session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+    if not key or action not in ("down", "up"):
+        return jsonify({"error": "Specify a key and action=down or action=up"}), 400
+
+    if action == "down":
+        error = unsupported_key_error(roku_ip, key)
+        if error:
+            return jsonify({"error": error, "unsupported": True}), 400
+        if start_hold(roku_ip, key):
+            logger.info(f"Holding {key} on {roku_ip}")
+        return jsonify({"success": True, "message": f"Holding {key}"}), 200
+    if stop_hold(roku_ip, key):
+        logger.info(f"Released {key} on {roku_ip}")
+    return jsonify({"success": True, "message": f"Released {key}"}), 200
+
+@app.route("/seek", methods=["POST"])
+def seek():
+    """Seek the selected Roku's current video to an absolute or relative position"""
+    data = request.get_json(silent=True) or request.form
+    value = str(data.get("position", ""))
+    roku_ip = session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+
+    try:
+        player = get_media_player(roku_ip)
+        target = parse_seek_target(value, player["position"] or 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error reading media player on {roku_ip}: {e}")
+        return jsonify({"error": f"Error reading media player: {str(e)}"}), 500
+
+    logger.info(f"Seeking {roku_ip} to {target:.0f}s")
+    try:
+        result = seek_to(roku_ip, target)
+    except Exception as e:
+        logger.error(f"Error seeking on {roku_ip}: {e}")
+        return jsonify({"error": f"Error seeking: {str(e)}"}), 500
+    if result["success"]:
+        logger.info(f"Seek on {roku_ip} landed {result['error_s']:+.1f}s from target in {result['ecp_calls']} calls")
+    return jsonify(result), 200 if result["success"] else 500
+
+@app.route("/wake", methods=["POST"])
+def wake():
+    """Bring the selected Roku out of standby"""
+    roku_ip = session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+
+    start = time.monotonic()
+    ready = wake_roku(roku_ip)
+    if ready:
+        return jsonify({"success": True, "message": f"{roku_ip} is ready",
+                        "waited": round(time.monotonic() - start, 2)}), 200
+    if ready is None:
+        return jsonify({"error": f"Cannot connect to {roku_ip}"}), 502
+    return jsonify({"error": f"{roku_ip} did not wake up within {WAKE_TIMEOUT}s"}), 504
+
+
+
+@app.route("/broadcast", methods=["POST"])
+def broadcast():
+    """Send a key or app launch to a set of devices and/or a group at once"""
+    data = request.get_json(silent=True) or request.form
+    devices = data.getlist("devices") if hasattr(data, "getlist") else data.get("devices")
+    if isinstance(devices, list) and len(devices) == 1:
+        devices = devices[0]
+    key = data.get("key")
+    app_id = data.get("app_id")
+    wake = str(data.get("wake", "1")) != "0"
+    synchronized = str(data.get("sync", "0")) == "1"
+
+    if bool(key) == bool(app_id):
+        return jsonify({"error": "Specify exactly one of key or app_id"}), 400
+    try:
+        if key:
+            check_key_name(key, "Broadcast")
+        else:
+            app_id = check_app_id(app_id, "Broadcast")
+        check_device_set(devices, data.get("group"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        roku_ips = resolve_device_set(devices, data.get("group"))
+    except KeyError as e:
+        return jsonify({"error": f"Unknown group {e}"}), 404
+    if not roku_ips:
+        return jsonify({"error": "No devices specified"}), 400
+
+    logger.info(f"Broadcasting {key or 'launch ' + app_id} to {len(roku_ips)} device(s)")
+    start = time.monotonic()
+    extra = {}
+    if synchronized:
+        try:
+            lead_ms = float(data.get("lead_ms", SYNC_LEAD_MS))
+        except (TypeError, ValueError):
+            lead_ms = None
+        if lead_ms is None or not 0 <= lead_ms <= SYNC_MAX_LEAD_MS:  # Also false for nan
+            return jsonify({"error": f"lead_ms must be a number between 0 and {SYNC_MAX_LEAD_MS}"}), 400
+        results, extra["sync"] = synchronized_dispatch(roku_ips, key=key, app_id=app_id, lead_ms=lead_ms)
+    else:
+        results = broadcast_command(roku_ips, key=key, app_id=app_id, wake=wake)
+    succeeded = sum(1 for r in results.values() if r["success"])
+    return jsonify({"success": succeeded == len(results), "succeeded": succeeded, "failed": len(results) - succeeded,
+                    "ms": round((time.monotonic() - start) * 1000, 1), "results": results, **extra}), 200
+
+@app.route("/macros", methods=["GET"])
+def list_macros():
+    """List saved macros"""
+    with _macros_lock:
+        _reload_macros_if_changed()
+        return jsonify(macros), 200
+
+@app.route("/macros", methods=["POST"])
+def save_macro():
+    """Create or replace a macro from JSON {"name": ..., "steps": [...]}"""
+    data = request.get_json(silent=True) or {}
+    name = str(data.get("name", "")).strip()
+    if not re.fullmatch(r"[\w\- ]{1,64}", name):
+        return jsonify({"error": "Macro name must be 1-64 letters, digits, spaces, '-' or '_'"}), 400
+    try:
+        validate_macro(data.get("steps"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with _editing_macros() as table:
+        table[name] = data["steps"]
+        save_macros()
+    logger.info(f"Saved macro '{name}' with {len(data['steps'])} step(s)")
+    return jsonify({"success": True, "message": f"Saved macro {name}"}), 200
+
+@app.route("/macros/<name>", methods=["DELETE"])
+def delete_macro(name):
+    with _editing_macros() as table:
+        if name not in table:
+            return jsonify({"error": f"No macro named {name}"}), 404
+        del table[name]
+        save_macros()
+    logger.info(f"Deleted macro '{name}'")
+    return jsonify({"success": True, "message": f"Deleted macro {name}"}), 200
+
+@app.route("/macros/<name>/run", methods=["POST"])
+def run_macro_route(name):
+    """Run a saved macro on the selected Roku (or the device given in the request)"""
+    data = request.get_json(silent=True) or request.form
+    roku_ip = data.get("device") or session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+    steps = get_macro(name)
+    if steps is None:
+        return jsonify({"error": f"No macro named {name}"}), 404
+
+    logger.info(f"Running macro '{name}' on {roku_ip}")
+    start = time.monotonic()
+    results = run_macro(roku_ip, steps, stop_on_error=str(data.get("stop_on_error", "1")) != "0")
+    succeeded = all(r["success"] for r in results) and len(results) == sum(
+        s.get("repeat", 1) for s in steps if "delay" not in s)
+    message = f"Ran macro {name}" if succeeded else f"Macro {name} failed"
+    return jsonify({"success": succeeded, "message": message, "macro": name,
+                    "ms": round((time.monotonic() - start) * 1000, 1), "steps": results}), 200 if succeeded else 500
+
+@app.route("/apps", methods=["GET"])
+def apps():
+    """Installed apps on the selected Roku, with cacheable icon URLs"""
+    roku_ip = request.args.get("device") or session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+    catalog = get_app_catalog(roku_ip)
+    if catalog is None:
+        return jsonify({"error": f"Could not get the app list from {roku_ip}"}), 502
+    return jsonify({"apps": [dict(app, icon=icon_url(app)) for app in catalog]}), 200
+
+@app.route("/icon/<app_id>", methods=["GET"])
+def icon(app_id):
+    """Serve an app icon from the LRU cache with long-lived, validatable cache headers"""
+    version = request.args.get("v", "0")
+    roku_ip = request.args.get("device") or session.get("roku_ip")
+    try:
+        if roku_ip is None:
+            # Icons are the same on every device; without a device only cached copies can be served
+            with _icon_lock:
+                cached = _icon_memory.get((app_id, version))
+            if cached is None and not os.path.exists(_icon_disk_path((app_id, version))):
+                return jsonify({"error": "No Roku selected"}), 400
+        data, content_type, etag = get_app_icon(roku_ip, app_id, version)
+    except Exception as e:
+        logger.error(f"Could not get icon for app {app_id}: {e}")
+        return jsonify({"error": f"Could not get icon for app {app_id}"}), 502
+
+    resp = Response(data, mimetype=content_type)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = f"public, max-age={ICON_MAX_AGE}, immutable"
+    return resp.make_conditional(request)
+
+@app.route("/events", methods=["GET"])
+def events():
+    """Server-sent event stream of now-playing changes for the selected Roku"""
+    roku_ip = request.args.get("device") or session.get("roku_ip")
+    if not roku_ip:
+        return jsonify({"error": "No Roku selected"}), 400
+
+    q = subscribe_now_playing(roku_ip)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield f"data: {json.dumps(q.get(timeout=NOW_PLAYING_HEARTBEAT))}\n\n"
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            unsubscribe_now_playing(roku_ip, q)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/schedule", methods=["GET"])
+def list_schedule():
+    """List scheduled actions with their next run time"""
+    with _schedule_cond:
+        _reload_schedule_if_changed()
+        return jsonify(schedule), 200
+
+@app.route("/schedule", methods=["POST"])
+def save_schedule_entry():
+    """Create or replace a scheduled action from JSON.
+
+    Example: {"id": "lobby-off", "cron": "0 23 * * *", "group": "lobby", "key": "PowerOff"} or
+    {"id": "signage", "at": "2026-01-05T07:30", "devices": ["192.168.1.8"], "app_id": "12", "missed": "skip"}
+    """
+    entry = request.get_json(silent=True) or {}
+    try:
+        validate_schedule_entry(entry)
+    except KeyError as e:
+        return jsonify({"error": f"Unknown group {e}"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    entry = {k: v for k, v in entry.items() if k not in ("last_run", "next_run")}
+    entry["created"] = time.time()
+    with _schedule_cond:
+        _reload_schedule_if_changed()
+        schedule[entry["id"]] = entry
+        _push_entry(entry["id"], time.time())
+        save_schedule()
+        _schedule_cond.notify()
+    logger.info(f"Scheduled {entry['id']}, next run {entry['next_run']}")
+    return jsonify({"success": True, "message": f"Scheduled {entry['id']}", "next_run": entry["next_run"]}), 200
+
+@app.route("/schedule/<entry_id>", methods=["DELETE"])
+def delete_schedule_entry(entry_id):
+    with _schedule_cond:
+        _reload_schedule_if_changed()
+        if entry_id not in schedule:
+            return jsonify({"error": f"No scheduled entry {entry_id}"}), 404
+        del schedule[entry_id]
+        _push_entry(entry_id, time.time())  # Bumps the generation so its queued run is dropped
+        save_schedule()
+        _schedule_cond.notify()
+    logger.info(f"Removed scheduled entry {entry_id}")
+    return jsonify({"success": True, "message": f"Removed {entry_id}"}), 200
 
 @app.route("/status", methods=["GET"])
 def status():
     """Health check endpoint"""
     roku_ip = session.get("roku_ip")
     if roku_ip and test_roku_connection(roku_ip):
-        return jsonify({"status": "connected", "roku_ip": roku_ip}), 200
+        return jsonify({"status": "connected", "roku_ip": roku_ip,
+                        "capabilities": get_capabilities(roku_ip)}), 200
     else:
         return jsonify({"status": "disconnected", "roku_ip": roku_ip}), 200
 
+# JSON API v2: stateless, devices addressed in the path, no session or /select round trip
+
+def resolve_device_id(device_id):
+    """Map a device id (or IP) from an API v2 path to an address, or None if the device is unknown"""
+    refresh_devices()
+    device = find_device(device_id)
+    return device["ip"] if device else None
+
+@app.route("/api/v2/devices", methods=["GET"])
+def api_devices():
+    """List devices a page at a time, optionally filtered by room, group or a search string"""
+    refresh_devices(force=request.args.get("refresh") == "1")
+    try:
+        offset, limit = page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    devices, total = list_devices(room=request.args.get("room"), group=request.args.get("group"),
+                                  q=request.args.get("q"), offset=offset, limit=limit)
+    return jsonify({"devices": devices, "total": total, "offset": offset, "limit": limit}), 200
+
+@app.route("/api/v2/devices/<device_id>", methods=["GET"])
+def api_device(device_id):
+    """Registry entry, capabilities and foreground app of one device"""
+    roku_ip = resolve_device_id(device_id)
+    if not roku_ip:
+        return jsonify({"error": f"Unknown device {device_id}"}), 404
+    device = find_device(roku_ip)
+    try:
+        app_id, app_name = get_active_app(roku_ip)
+    except Exception as e:
+        return jsonify({**device, "reachable": False, "error": str(e)}), 200
+    return jsonify({**device, "reachable": True, "capabilities": get_capabilities(roku_ip),
+                    "active_app": {"id": app_id, "name": app_name}}), 200
+
+@app.route("/api/v2/devices/<device_id>/commands", methods=["POST"])
+def api_commands(device_id):
+    """Run a batch of commands on one device and return a result per command"""
+    roku_ip = resolve_device_id(device_id)
+    if not roku_ip:
+        return jsonify({"error": f"Unknown device {device_id}"}), 404
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {"commands": data}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON body"}), 400
+    commands = data.get("commands")
+    try:
+        validate_batch(commands)
+        pace_ms = float(data.get("pace_ms", BATCH_KEY_PACE_MS))
+        if not math.isfinite(pace_ms):
+            raise ValueError("pace_ms must be a finite number of milliseconds")
+        pace_ms = min(max(pace_ms, 0.0), BATCH_MAX_PACE_MS)
+        for flag in ("stop_on_error", "wake"):
+            if flag in data and not isinstance(data[flag], bool):
+                raise ValueError(f"{flag} must be true or false")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    logger.info(f"Running a batch of {len(commands)} command(s) on {roku_ip}")
+    start = time.monotonic()
+    results = run_batch(roku_ip, commands, stop_on_error=data.get("stop_on_error", False),
+                        wake=data.get("wake", True), pace_ms=pace_ms)
+    ok = all(r["ok"] for r in results)
+    return jsonify({"ok": ok, "ms": round((time.monotonic() - start) * 1000, 1), "results": results}), \
+        200 if ok else 207
+
 if __name__ == "__main__":
     logger.info(f"Starting ChoyRoku server on {FLASK_HOST}:{FLASK_PORT}")
     logger.info("Make sure your Roku devices are on the same network and accessible")
-    app.run(host=FLASK_HOST, port=FLASK_PORT, debug=False)
+    if SCHEDULER_ENABLED:
+        start_scheduler()  # Under gunicorn, gunicorn.conf.py starts it in each worker instead
+    if ASYNC_MODE:
+        from gevent.pywsgi import WSGIServer
+        logger.info("Serving in async mode")
+        WSGIServer((FLASK_HOST, FLASK_PORT), app, log=None).serve_forever()
+    else:
+        app.run(host=FLASK_HOST, port=FLASK_PORT, debug=False)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+ChoyRoku Microbenchmarks
+Runs ChoyRoku's keypress, launch, discovery and health-check paths in-process against loopback mock Rokus
+(mock_roku.py) and reports p50/p95/p99 latency and throughput, so regressions show up without real devices.
+
+  python3 benchmark.py                                       # 200 iterations per path, one client at a time
+  python3 benchmark.py --latency 30 --jitter 10 --concurrency 8
+  python3 benchmark.py --only keypress,launch --iterations 1000
+  python3 benchmark.py --save baseline.json                  # record a baseline...
+  python3 benchmark.py --compare baseline.json --tolerance 25  # ...and exit 1 if any p95 is >25% slower
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from mock_roku import MockRoku, address_range
+
+
+def percentile_summary(latencies_ms, elapsed, errors):
+    """p50/p95/p99/mean/max in ms plus throughput for one benchmark run"""
+    if not latencies_ms:
+        return {"runs": 0, "errors": errors, "throughput": 0.0}
+    if len(latencies_ms) > 1:
+        cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies_ms[0]
+    return {
+        "runs": len(latencies_ms),
+        "errors": errors,
+        "p50": round(p50, 2),
+        "p95": round(p95, 2),
+        "p99": round(p99, 2),
+        "mean": round(statistics.fmean(latencies_ms), 2),
+        "max": round(max(latencies_ms), 2),
+        "throughput": round(len(latencies_ms) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def run_benchmark(operation, iterations, concurrency, make_state, warmup=5):
+    """Call operation(state) iterations times spread over concurrency threads; each thread gets its own state.
+
+    operation returns True on success. Returns the percentile summary.
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(iterations))
+    states = [make_state(i) for i in range(concurrency)]
+    for state in states:
+        for _ in range(warmup):
+            operation(state)
+
+    def worker(state):
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                ok = operation(state)
+            except Exception:
+                ok = False
+            ms = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    latencies.append(ms)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(state,)) for state in states]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return percentile_summary(latencies, time.perf_counter() - start, errors[0])
+
+
+def prepare_app(addresses):
+    """Import ChoyRoku pointed at the mock devices, with background work and tap suppression turned off"""
+    devices_file = os.path.join(tempfile.mkdtemp(prefix="choyroku-bench-"), "devices.json")
+    with open(devices_file, "w") as f:
+        json.dump([{"ip": a, "name": f"Mock {a}"} for a in addresses], f)
+    logging.disable(logging.INFO)
+
+    import ChoyRoku
+    ChoyRoku.DEVICES_FILE = devices_file
+    ChoyRoku.DEVICE_DISCOVERY = False
+    # Benchmarks repeat the same press back to back; every one of them should reach the device
+    ChoyRoku.DEBOUNCE_WINDOW_MS = ChoyRoku.DEBOUNCE_REPEAT_WINDOW_MS = 0
+    ChoyRoku.DEBOUNCE_FOLD_REPEATS = False
+    ChoyRoku.load_devices()
+    return ChoyRoku
+
+
+def build_benchmarks(choyroku, addresses, discovery_timeout):
+    """name -> (operation, make_state); each worker's state is a test client with a mock selected"""
+
+    def selected_client(i):
+        client = choyroku.app.test_client()
+        client.post("/select", data={"roku_ip": addresses[i % len(addresses)]},
+                    headers={"Accept": "application/json"})
+        client.launches = 0
+        return client
+
+    def keypress(client):
+        return client.post("/send", data={"key": "Up"}).status_code == 200
+
+    def launch(client):
+        # Alternate apps so every launch is real rather than skipped as already running
+        client.launches += 1
+        app_id = "12" if client.launches % 2 else "837"
+        return client.post("/launch", data={"app_id": app_id}).status_code == 200
+
+    def discovery(_):
+        return set(choyroku.discover_rokus(timeout=discovery_timeout)) >= set(addresses)
+
+    def health(client):
+        resp = client.get("/status")
+        return resp.status_code == 200 and resp.get_json()["status"] == "connected"
+
+    return {
+        "keypress": (keypress, selected_client),
+        "launch": (launch, selected_client),
+        "discovery": (discovery, lambda i: None),
+        "health": (health, selected_client),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print p95 and throughput changes against a saved run; returns the names that regressed"""
+    regressed = []
+    print(f"\nCompared with baseline (tolerance {tolerance:g}%):")
+    for name, now in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "p95" not in before or "p95" not in now:
+            print(f"   {name:<10} no baseline")
+            continue
+        change = (now["p95"] - before["p95"]) / before["p95"] * 100 if before["p95"] else 0.0
+        slower = change > tolerance
+        mark = "❌" if slower else "✅"
+        print(f"   {mark} {name:<10} p95 {before['p95']:8.2f} -> {now['p95']:8.2f} ms ({change:+.0f}%)   "
+              f"throughput {before['throughput']:8.1f} -> {now['throughput']:8.1f} /s")
+        if slower:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for ChoyRoku against mock Rokus")
+    parser.add_argument("--iterations", type=int, default=200, help="runs per path (default: 200)")
+    parser.add_argument("--discovery-iterations", type=int, default=10, help="runs of discovery (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=1, help="clients running each path at once")
+    parser.add_argument("--devices", type=int, default=1, help="number of mock Rokus (default: 1)")
+    parser.add_argument("--address", default="127.0.0.2", help="address of the first mock (default: 127.0.0.2)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock response latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mock latency jitter in +/- ms")
+    parser.add_argument("--discovery-timeout", type=float, default=0.2,
+                        help="SSDP listen time per discovery run in seconds (default: 0.2)")
+    parser.add_argument("--only", help="comma-separated subset of keypress,launch,discovery,health")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--save", metavar="FILE", help="write results to FILE as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a baseline written by --save")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="allowed p95 slowdown in percent (default: 20)")
+    args = parser.parse_args()
+
+    addresses = address_range(args.address, args.devices)
+    mocks = [MockRoku(a, latency_ms=args.latency, jitter_ms=args.jitter).start() for a in addresses]
+    try:
+        choyroku = prepare_app(addresses)
+        benchmarks = build_benchmarks(choyroku, addresses, args.discovery_timeout)
+        names = args.only.split(",") if args.only else list(benchmarks)
+        unknown = [n for n in names if n not in benchmarks]
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+        if not args.json:
+            print(f"🎯 ChoyRoku microbenchmarks: {args.devices} mock Roku(s), latency {args.latency:g} ms "
+                  f"± {args.jitter:g} ms, concurrency {args.concurrency}")
+            print(f"{'path':<10} {'runs':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                  f"{'max ms':>9} {'ops/s':>9}")
+        results = {}
+        for name in names:
+            operation, make_state = benchmarks[name]
+            iterations = args.discovery_iterations if name == "discovery" else args.iterations
+            # Discovery is one scan of the whole network; running scans in parallel would measure contention
+            concurrency = 1 if name == "discovery" else args.concurrency
+            warmup = 1 if name == "discovery" else 5
+            r = results[name] = run_benchmark(operation, iterations, concurrency, make_state, warmup=warmup)
+            if not args.json:
+                if r["runs"]:
+                    print(f"{name:<10} {r['runs']:>6} {r['errors']:>6} {r['p50']:>9.2f} {r['p95']:>9.2f} "
+                          f"{r['p99']:>9.2f} {r['max']:>9.2f} {r['throughput']:>9.1f}")
+                else:
+                    print(f"{name:<10} {0:>6} {r['errors']:>6}   every run failed")
+    finally:
+        for mock in mocks:
+            mock.stop()
+
+    report = {"settings": {k: v for k, v in vars(args).items() if k not in ("json", "save", "compare")},
+              "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        if not args.json:
+            print(f"\n💾 Saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed:
+            print(f"\n⚠️  Slower than baseline: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+ChoyRoku Terminal Remote
+Controls a Roku straight from the terminal over one persistent ECP connection.
+
+  python3 choyroku_cli.py --roku 192.168.1.129              # interactive remote
+  python3 choyroku_cli.py --roku 192.168.1.129 key Home Down Select
+  python3 choyroku_cli.py --roku 192.168.1.129 launch 837
+  python3 choyroku_cli.py --roku 192.168.1.129 text "star trek"
+"""
+
+import argparse
+import http.client
+import os
+import select
+import socket
+import sys
+import time
+from urllib.parse import quote
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows
+    termios = None
+    import msvcrt
+
+ROKU_PORT = 8060
+
+# Terminal input -> ECP key. Printable characters not listed here are typed with Lit_ keypresses.
+KEY_BINDINGS = {
+    "\x1b[A": "Up", "\x1b[B": "Down", "\x1b[C": "Right", "\x1b[D": "Left",
+    "\x1bOA": "Up", "\x1bOB": "Down", "\x1bOC": "Right", "\x1bOD": "Left",
+    "\r": "Select", "\n": "Select",
+    "\x7f": "Backspace", "\x08": "Backspace",
+    "\x1b": "Back",
+    "\x1b[H": "Home", "\x1b[1~": "Home", "\x1bOH": "Home",
+    "\x1b[5~": "Rev", "\x1b[6~": "Fwd",
+    "\x1b[2~": "InstantReplay",
+    "\x10": "Play",          # Ctrl-P
+    "\x15": "VolumeUp",      # Ctrl-U
+    "\x04": "VolumeDown",    # Ctrl-D
+    "\x09": "Info",          # Tab (the * button)
+}
+QUIT_KEYS = {"\x03", "\x11"}  # Ctrl-C, Ctrl-Q
+
+# Windows console arrow/navigation keys arrive as a prefix byte followed by a scan code
+WINDOWS_SCAN_CODES = {"H": "Up", "P": "Down", "M": "Right", "K": "Left", "G": "Home",
+                      "I": "Rev", "Q": "Fwd", "R": "InstantReplay"}
+
+HELP = """Interactive Roku remote ({roku})
+  Arrows: navigate   Enter: OK   Esc: Back   Home: Home   Backspace: Backspace
+  PgUp/PgDn: Rev/Fwd   Insert: Instant Replay   Tab: Info (*)
+  Ctrl-P: Play/Pause   Ctrl-U/Ctrl-D: Volume up/down
+  Any other printable character is typed with Lit_ keypresses.
+  Ctrl-C or Ctrl-Q: quit
+"""
+
+
+class EcpConnection:
+    """Keep-alive HTTP connection to one Roku, reopened transparently if the device drops it"""
+
+    def __init__(self, roku_ip, timeout=5):
+        self.roku_ip = roku_ip
+        self.timeout = timeout
+        self.conn = None
+
+    def _connect(self):
+        self.conn = http.client.HTTPConnection(self.roku_ip, ROKU_PORT, timeout=self.timeout)
+        self.conn.connect()
+        # Keypresses are tiny; do not let Nagle hold them back
+        self.conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def post(self, path):
+        """POST an ECP command; returns (status, rtt_ms).
+
+        Only a kept-alive connection the device has since dropped is retried, since it fails before the
+        request is read. Anything else, a read timeout in particular, may come after the device acted on
+        the command, and resending would press the key or restart the channel twice.
+        """
+        for attempt in range(2):
+            reused = self.conn is not None
+            try:
+                if not reused:
+                    self._connect()
+                start = time.perf_counter()
+                self.conn.request("POST", f"/{path}", headers={"Content-Length": "0"})
+                resp = self.conn.getresponse()
+                resp.read()
+                rtt = (time.perf_counter() - start) * 1000
+                if resp.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return resp.status, rtt
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt or not reused:
+                    raise
+            except (http.client.HTTPException, OSError):
+                self.close()
+                raise
+
+    def keypress(self, key):
+        return self.post(f"keypress/{key}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def literal_key(ch):
+    return f"Lit_{quote(ch, safe='')}"
+
+
+def report(label, status, rtt):
+    """One status line per key, so the latency of every press is visible"""
+    mark = "✅" if status == 200 else "❌"
+    return f"{mark} {label:<16} {status}  {rtt:7.1f} ms"
+
+
+def read_key_posix(fd):
+    """Read one keystroke, gathering the rest of an escape sequence if one arrives"""
+    data = os.read(fd, 1)
+    if data == b"\x1b":
+        # A lone Esc is Back; arrow keys and friends follow the Esc within a few milliseconds
+        while select.select([fd], [], [], 0.03)[0]:
+            data += os.read(fd, 1)
+            if len(data) >= 3 and (data[-1:].isalpha() or data.endswith(b"~")):
+                break
+    elif data[0] >= 0xC0:
+        # Multi-byte UTF-8 character: the leading byte says how many continuation bytes follow
+        length = 2 if data[0] < 0xE0 else 3 if data[0] < 0xF0 else 4
+        while len(data) < length:
+            data += os.read(fd, length - len(data))
+    return data.decode("utf-8", errors="replace")
+
+
+def read_key_windows():
+    ch = msvcrt.getwch()
+    if ch in ("\x00", "\xe0"):
+        return ("scan", WINDOWS_SCAN_CODES.get(msvcrt.getwch()))
+    return ch
+
+
+def interactive(ecp):
+    print(HELP.format(roku=ecp.roku_ip))
+    fd = sys.stdin.fileno() if termios else None
+    saved = termios.tcgetattr(fd) if termios else None
+    try:
+        if termios:
+            tty.setraw(fd)
+        while True:
+            ch = read_key_posix(fd) if termios else read_key_windows()
+            if isinstance(ch, tuple):
+                key, label = ch[1], ch[1]
+            elif ch in QUIT_KEYS:
+                break
+            elif ch in KEY_BINDINGS:
+                key = label = KEY_BINDINGS[ch]
+            elif len(ch) == 1 and ch.isprintable():
+                key, label = literal_key(ch), f"'{ch}'"
+            else:
+                key = None
+            if key is None:
+                continue
+            try:
+                line = report(label, *ecp.keypress(key))
+            except Exception as e:
+                line = f"❌ {label:<16} {e}"
+            # Raw mode does not translate \n, so return the carriage explicitly
+            sys.stdout.write(line + "\r\n")
+            sys.stdout.flush()
+    finally:
+        if termios:
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        ecp.close()
+
+
+def find_default_roku():
+    """Pick the first Roku SSDP finds when --roku is not given"""
+    from find_rokus import discover_via_ssdp
+    found = discover_via_ssdp()
+    return next(iter(found), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="choyroku", description="Terminal remote for Roku devices")
+    parser.add_argument("--roku", default=os.environ.get("CHOYROKU_ROKU"),
+                        help="Roku IP address (default: $CHOYROKU_ROKU, else the first device found via SSDP)")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("interactive", help="raw-mode interactive remote (default)")
+    key_parser = sub.add_parser("key", help="send one or more keys")
+    key_parser.add_argument("keys", nargs="+")
+    launch_parser = sub.add_parser("launch", help="launch an app by id")
+    launch_parser.add_argument("app_id")
+    text_parser = sub.add_parser("text", help="type a string with Lit_ keypresses")
+    text_parser.add_argument("text")
+    args = parser.parse_args()
+
+    roku_ip = args.roku or find_default_roku()
+    if not roku_ip:
+        print("❌ No Roku found. Pass --roku <ip> or set CHOYROKU_ROKU.")
+        sys.exit(1)
+    ecp = EcpConnection(roku_ip)
+
+    try:
+        if args.command in (None, "interactive"):
+            if not sys.stdin.isatty():
+                print("❌ Interactive mode needs a terminal")
+                sys.exit(1)
+            interactive(ecp)
+        elif args.command == "key":
+            for key in args.keys:
+                print(report(key, *ecp.keypress(key)))
+        elif args.command == "launch":
+            print(report(f"launch {args.app_id}", *ecp.post(f"launch/{args.app_id}")))
+        elif args.command == "text":
+            start = time.perf_counter()
+            for ch in args.text:
+                print(report(f"'{ch}'", *ecp.keypress(literal_key(ch))))
+            print(f"Typed {len(args.text)} characters in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        ecp.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -48,6 +48,7 @@ def discover_via_ssdp():
         
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)  # room for hundreds of answers
         sock.settimeout(3)
         sock.sendto(message.encode('utf-8'), ('239.255.255.250', 1900))
         
@@ -70,7 +71,6 @@ def discover_via_ssdp():
 
 def scan_common_ips():
     """Scan common IP addresses where Roku devices might be"""
-    found = {}
     common_ips = [
         "192.168.1.4",   # Your current setting
         "192.168.1.8",   # Your second setting
@@ -88,31 +88,18 @@ def scan_common_ips():
         "192.168.0.105",
     ]
     
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_ip = {executor.submit(check_roku_ip, ip): ip for ip in common_ips}
-        for future in as_completed(future_to_ip):
-            ip = future_to_ip[future]
-            try:
-                result = future.result()
-                if result:
-                    found[ip] = result
-                    print(f"   ✅ Found at {ip}: {result}")
-            except Exception as e:
-                pass
-    
-    return found
+    return scan_ips(common_ips, max_workers=10)
 
-def scan_dhcp_range():
+def scan_dhcp_range(base_ip="192.168.1.", first=100, last=200):
     """Scan typical DHCP range (192.168.1.100-200)"""
+    return scan_ips([base_ip + str(i) for i in range(first, last + 1)])
+
+def scan_ips(ips, max_workers=20):
+    """Check each address for a Roku in parallel; returns {ip: name}"""
     found = {}
-    base_ip = "192.168.1."
     
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_ip = {}
-        for i in range(100, 201):
-            ip = base_ip + str(i)
-            future_to_ip[executor.submit(check_roku_ip, ip)] = ip
-        
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_ip = {executor.submit(check_roku_ip, ip): ip for ip in ips}
         for future in as_completed(future_to_ip):
             ip = future_to_ip[future]
             try:
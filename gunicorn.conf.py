@@ -0,0 +1,32 @@
+# Gunicorn configuration for ChoyRoku (used by start_choyroku.sh)
+#
+# CHOYROKU_SERVER selects how requests are served:
+#   threaded (default) - a few worker processes with a thread per in-flight request. Each request waiting on a Roku
+#                        holds a thread, and each open event stream or WebSocket holds one for as long as it is open.
+#   async              - one gevent worker process. Waiting on a Roku, an event stream or a WebSocket costs a
+#                        greenlet rather than a thread, so hundreds of remotes fit in one process. Needs gevent.
+import multiprocessing
+import os
+
+mode = os.environ.get("CHOYROKU_SERVER", "threaded")
+
+bind = os.environ.get("CHOYROKU_BIND", "0.0.0.0:8000")
+timeout = 60
+graceful_timeout = 10
+
+if mode == "async":
+    worker_class = "gevent"
+    # One process keeps a single now-playing poller, app catalog and icon cache per device
+    workers = int(os.environ.get("CHOYROKU_WORKERS", 1))
+    worker_connections = int(os.environ.get("CHOYROKU_CONNECTIONS", 1000))
+else:
+    worker_class = "gthread"
+    workers = int(os.environ.get("CHOYROKU_WORKERS", min(multiprocessing.cpu_count(), 4)))
+    threads = int(os.environ.get("CHOYROKU_THREADS", 8))
+
+
+def post_worker_init(worker):
+    """Start the scheduler once the app is loaded; the first worker to take the schedule lock runs it"""
+    import ChoyRoku
+    if ChoyRoku.SCHEDULER_ENABLED:
+        ChoyRoku.start_scheduler()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Mock Roku ECP Server
+Serves the parts of the Roku External Control Protocol that ChoyRoku uses, on loopback addresses, with
+configurable latency and jitter, so the app can be run and measured without real devices.
+
+  python3 mock_roku.py                                      # one mock Roku on 127.0.0.2:8060
+  python3 mock_roku.py --count 3 --latency 40 --jitter 15   # 127.0.0.2, 127.0.0.3 and 127.0.0.4
+  python3 mock_roku.py --address 127.0.0.9 --tv --standby   # a TV that starts in standby
+
+ChoyRoku always talks to port 8060, so each mock gets its own address. Linux routes all of 127.0.0.0/8 to
+loopback; on macOS add the extra addresses first (sudo ifconfig lo0 alias 127.0.0.2).
+"""
+
+import argparse
+import ipaddress
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+from xml.sax.saxutils import escape
+
+ECP_PORT = 8060
+
+DEFAULT_APPS = [
+    ("12", "Netflix", "5.1.123"),
+    ("837", "YouTube", "2.21.1"),
+    ("2285", "Hulu", "7.3.2"),
+    ("291097", "Disney Plus", "1.37.2"),
+    ("13", "Prime Video", "14.4.3"),
+    ("562859", "Free Live TV", "1.0.4"),
+]
+
+# Smallest valid PNG (1x1, transparent), served for every app icon
+ICON_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+
+class MockRoku:
+    """One simulated Roku: device state plus an ECP HTTP server on its own address"""
+
+    def __init__(self, address, name=None, latency_ms=0.0, jitter_ms=0.0, is_tv=False, standby=False,
+                 wake_delay=1.0, apps=DEFAULT_APPS, serial=None, port=ECP_PORT):
+        self.address = address
+        self.port = port
+        self.name = name or f"Mock Roku {address}"
+        self.serial = serial or "MOCK" + "".join(f"{int(part):03d}" for part in address.split("."))
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.is_tv = is_tv
+        self.wake_delay = wake_delay
+        self.apps = list(apps)
+        self.lock = threading.Lock()
+        self.power_mode = "Ready" if standby and is_tv else "PowerOn"
+        self.wake_at = None
+        self.active_app = None
+        self.playing_since = None
+        self.requests = 0
+        self.online = True  # False: the device has dropped off the network and drops every connection
+        self.server = None
+
+    # Device behaviour
+
+    def delay(self):
+        """Sleep for the configured latency, +/- up to jitter_ms"""
+        ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def _settle(self):
+        if self.wake_at is not None and time.monotonic() >= self.wake_at:
+            self.power_mode, self.wake_at = "PowerOn", None
+
+    def press(self, key):
+        with self.lock:
+            self._settle()
+            if key in ("PowerOn", "Power") and self.power_mode != "PowerOn":
+                if self.wake_at is None:
+                    self.wake_at = time.monotonic() + self.wake_delay
+            elif key in ("PowerOff", "Power") and self.is_tv:
+                self.power_mode, self.active_app, self.playing_since = "DisplayOff", None, None
+            elif key == "Home":
+                self.active_app, self.playing_since = None, None
+            elif key == "Play" and self.active_app:
+                self.playing_since = None if self.playing_since else time.monotonic()
+        return 200
+
+    def launch(self, app_id):
+        with self.lock:
+            if not any(a[0] == app_id for a in self.apps):
+                return 404
+            self.active_app, self.playing_since = app_id, time.monotonic()
+        return 200
+
+    # ECP documents
+
+    def device_info(self):
+        with self.lock:
+            self._settle()
+            power_mode = self.power_mode
+        fields = {
+            "udn": f"mock-{self.serial.lower()}",
+            "serial-number": self.serial,
+            "vendor-name": "Roku",
+            "model-name": "Mock Roku TV" if self.is_tv else "Mock Roku Streaming Stick",
+            "model-number": "7000X" if self.is_tv else "3820X",
+            "friendly-device-name": self.name,
+            "user-device-name": self.name,
+            "is-tv": "true" if self.is_tv else "false",
+            "is-stick": "false" if self.is_tv else "true",
+            "supports-suspend": "true" if self.is_tv else "false",
+            "supports-find-remote": "true",
+            "supports-private-listening": "true",
+            "supports-wake-on-wlan": "false",
+        }
+        if self.is_tv:
+            fields["power-mode"] = power_mode
+        body = "".join(f"<{k}>{escape(v)}</{k}>" for k, v in fields.items())
+        return f'<?xml version="1.0" encoding="UTF-8" ?>\n<device-info>{body}</device-info>\n'
+
+    def active_app_xml(self):
+        with self.lock:
+            app = next((a for a in self.apps if a[0] == self.active_app), None)
+        if app is None:
+            return '<?xml version="1.0" encoding="UTF-8" ?>\n<active-app><app>Roku</app></active-app>\n'
+        return (f'<?xml version="1.0" encoding="UTF-8" ?>\n<active-app><app id="{app[0]}" type="appl" '
+                f'version="{app[2]}">{escape(app[1])}</app></active-app>\n')
+
+    def media_player_xml(self):
+        with self.lock:
+            if self.active_app is None:
+                return '<?xml version="1.0" encoding="UTF-8" ?>\n<player error="false" state="close" />\n'
+            started = self.playing_since
+        state = "play" if started else "pause"
+        position = int((time.monotonic() - started) * 1000) if started else 0
+        return (f'<?xml version="1.0" encoding="UTF-8" ?>\n<player error="false" state="{state}">'
+                f'<position>{position} ms</position><duration>3600000 ms</duration><is_live>false</is_live>'
+                f'</player>\n')
+
+    def apps_xml(self):
+        body = "".join(f'<app id="{i}" type="appl" version="{v}">{escape(n)}</app>' for i, n, v in self.apps)
+        return f'<?xml version="1.0" encoding="UTF-8" ?>\n<apps>{body}</apps>\n'
+
+    # Server lifecycle
+
+    def start(self):
+        self.server = EcpServer((self.address, self.port), EcpHandler)
+        self.server.roku = self
+        threading.Thread(target=self.server.serve_forever, name=f"mock-{self.address}", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class EcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Benchmarks open many connections at once
+
+    def server_bind(self):
+        # HTTPServer looks up the FQDN of the address, which takes ~100 ms per mock when there are hundreds
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = self.server_address[:2]
+
+
+class EcpHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so pipelined keypresses work as on a real device
+    server_version = "Roku/9.10"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b"", content_type="text/xml; charset=utf-8"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _offline(self):
+        if self.server.roku.online:
+            return False
+        self.close_connection = True
+        return True
+
+    def do_GET(self):
+        roku = self.server.roku
+        if self._offline():
+            return
+        roku.requests += 1
+        roku.delay()
+        path = urlsplit(self.path).path
+        if path == "/query/device-info":
+            self._reply(200, roku.device_info())
+        elif path == "/query/active-app":
+            self._reply(200, roku.active_app_xml())
+        elif path == "/query/media-player":
+            self._reply(200, roku.media_player_xml())
+        elif path == "/query/apps":
+            self._reply(200, roku.apps_xml())
+        elif path.startswith("/query/icon/"):
+            self._reply(200, ICON_PNG, "image/png")
+        else:
+            self._reply(404)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        roku = self.server.roku
+        if self._offline():
+            return
+        roku.requests += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        roku.delay()
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        action, arg = parts[0], unquote(parts[1]) if len(parts) > 1 else ""
+        if action == "keypress" and arg:
+            self._reply(roku.press(arg))
+        elif action in ("keydown", "keyup", "search", "input") and (arg or action == "search"):
+            self._reply(200)
+        elif action == "launch" and arg:
+            self._reply(roku.launch(arg))
+        else:
+            self._reply(404)
+
+
+def address_range(first, count):
+    """count consecutive IPv4 addresses starting at first"""
+    start = ipaddress.IPv4Address(first)
+    return [str(start + i) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Roku ECP server for local testing and benchmarks")
+    parser.add_argument("--address", default="127.0.0.2", help="address of the first mock (default: 127.0.0.2)")
+    parser.add_argument("--count", type=int, default=1, help="number of mocks on consecutive addresses")
+    parser.add_argument("--latency", type=float, default=0.0, help="added response latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency varies by up to +/- this many ms")
+    parser.add_argument("--tv", action="store_true", help="report as a Roku TV (power modes, volume)")
+    parser.add_argument("--standby", action="store_true", help="TVs start in standby and wake on PowerOn")
+    parser.add_argument("--wake-delay", type=float, default=1.0, help="seconds a TV takes to wake (default: 1)")
+    args = parser.parse_args()
+
+    rokus = [MockRoku(address, latency_ms=args.latency, jitter_ms=args.jitter, is_tv=args.tv,
+                      standby=args.standby, wake_delay=args.wake_delay).start()
+             for address in address_range(args.address, args.count)]
+    for roku in rokus:
+        print(f"📺 {roku.name} on {roku.address}:{roku.port}")
+    print(f"Latency {args.latency:g} ms ± {args.jitter:g} ms. Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for roku in rokus:
+            roku.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Simulated Roku Fleet
+Runs many mock Rokus on loopback, each with an ECP endpoint (mock_roku.py) and an SSDP responder, so discovery
+can be tested at scale with configurable device counts, response delays, packet loss and churn.
+
+  python3 roku_fleet.py --count 100                            # serve 100 devices until Ctrl-C
+  python3 roku_fleet.py --count 100 --loss 0.1 --churn 0.05    # lossy network, 5% of devices come and go
+  python3 roku_fleet.py --benchmark                            # time discovery at 10, 100 and 1000 devices
+  python3 roku_fleet.py --benchmark --sizes 50,500 --ssdp-delay 1000 --runs 5
+
+Devices take consecutive addresses from 127.0.1.1 (see mock_roku.py for macOS). The fleet listens for
+M-SEARCH on the SSDP multicast group, port 1900, and each device answers from its own address, so discovery
+sees one responder per device exactly as on a real network.
+"""
+
+import argparse
+import contextlib
+import heapq
+import io
+import itertools
+import json
+import logging
+import random
+import re
+import socket
+import statistics
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_roku import MockRoku, address_range
+
+SSDP_GROUP = "239.255.255.250"
+SSDP_PORT = 1900
+
+# What a Roku sends back to an M-SEARCH for roku:ecp
+SSDP_REPLY = (
+    "HTTP/1.1 200 OK\r\n"
+    "Cache-Control: max-age=3600\r\n"
+    "ST: roku:ecp\r\n"
+    "USN: uuid:roku:ecp:{serial}\r\n"
+    "Ext: \r\n"
+    "Server: Roku/9.10 UPnP/1.0 Roku/9.10\r\n"
+    "LOCATION: http://{address}:{port}/\r\n"
+    "\r\n"
+)
+
+
+def raise_open_file_limit(needed):
+    """Each device holds a listening socket and a UDP socket; the default limit on macOS is 256"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+class Fleet:
+    """count mock Rokus on consecutive addresses plus the SSDP responders that announce them"""
+
+    def __init__(self, first_address, count, latency_ms=0.0, jitter_ms=0.0, ssdp_delay_ms=100.0, loss=0.0,
+                 churn=0.0, churn_interval=5.0):
+        self.rokus = [MockRoku(address, latency_ms=latency_ms, jitter_ms=jitter_ms)
+                      for address in address_range(first_address, count)]
+        self.ssdp_delay_ms = ssdp_delay_ms
+        self.loss = loss
+        self.churn = churn
+        self.churn_interval = churn_interval
+        self.ssdp_enabled = True
+        self.searches = 0
+        self.replies = 0
+        self._listener = None
+        self._responders = {}  # address -> (socket bound to that address, reply datagram)
+        self._due = []  # heap of (send at, seq, address, searcher)
+        self._seq = itertools.count()
+        self._due_ready = threading.Condition()
+        self._stopped = threading.Event()
+
+    @property
+    def addresses(self):
+        return [roku.address for roku in self.rokus]
+
+    def online(self):
+        return {roku.address for roku in self.rokus if roku.online}
+
+    # SSDP
+
+    def _listen(self):
+        """Queue a reply from every online device for each roku:ecp search, each after its own random delay"""
+        while not self._stopped.is_set():
+            try:
+                data, searcher = self._listener.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            text = data.decode("utf-8", errors="replace")
+            if not self.ssdp_enabled or not text.startswith("M-SEARCH"):
+                continue
+            st = re.search(r"^ST:\s*(\S+)", text, re.IGNORECASE | re.MULTILINE)
+            if not st or st.group(1) not in ("roku:ecp", "ssdp:all"):
+                continue
+            # Devices spread their answers over MX seconds so they do not all arrive at once
+            window = self.ssdp_delay_ms / 1000
+            mx = re.search(r"^MX:\s*(\d+)", text, re.IGNORECASE | re.MULTILINE)
+            if mx:
+                window = min(window, int(mx.group(1)))
+            self.searches += 1
+            now = time.monotonic()
+            with self._due_ready:
+                for roku in self.rokus:
+                    if roku.online and random.random() >= self.loss:
+                        heapq.heappush(self._due, (now + random.uniform(0, window), next(self._seq),
+                                                   roku.address, searcher))
+                self._due_ready.notify()
+
+    def _send_replies(self):
+        while True:
+            with self._due_ready:
+                while not self._stopped.is_set():
+                    wait = self._due[0][0] - time.monotonic() if self._due else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._due_ready.wait(wait)
+                if self._stopped.is_set():
+                    return
+                _, _, address, searcher = heapq.heappop(self._due)
+            sock, reply = self._responders[address]
+            try:
+                sock.sendto(reply, searcher)
+                self.replies += 1
+            except OSError:
+                pass
+
+    def _churn(self):
+        """Every churn_interval, each device is offline for the next interval with probability churn"""
+        while not self._stopped.wait(self.churn_interval):
+            for roku in self.rokus:
+                roku.online = random.random() >= self.churn
+
+    # Lifecycle
+
+    def start(self):
+        raise_open_file_limit(len(self.rokus) * 3 + 256)
+        for roku in self.rokus:
+            roku.start()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.bind((roku.address, 0))
+            reply = SSDP_REPLY.format(serial=roku.serial, address=roku.address, port=roku.port).encode()
+            self._responders[roku.address] = (sock, reply)
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(("", SSDP_PORT))
+        membership = struct.pack("4s4s", socket.inet_aton(SSDP_GROUP), socket.inet_aton("0.0.0.0"))
+        self._listener.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self._listener.settimeout(0.5)
+
+        threading.Thread(target=self._listen, name="fleet-ssdp", daemon=True).start()
+        threading.Thread(target=self._send_replies, name="fleet-ssdp-replies", daemon=True).start()
+        if self.churn:
+            threading.Thread(target=self._churn, name="fleet-churn", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._due_ready:
+            self._due_ready.notify_all()
+        if self._listener is not None:
+            self._listener.close()
+        for sock, _ in self._responders.values():
+            sock.close()
+        self._responders.clear()
+        # Each server takes up to half a second to notice shutdown; stop them together
+        with ThreadPoolExecutor(max_workers=min(len(self.rokus), 64) or 1) as pool:
+            list(pool.map(MockRoku.stop, self.rokus))
+
+
+def discovery_methods(choyroku, find_rokus, fleet, timeout):
+    """name -> function returning the set of addresses found"""
+
+    def choyroku_ssdp():
+        fleet.ssdp_enabled = True
+        return set(choyroku.discover_rokus(timeout=timeout))
+
+    def choyroku_probe():
+        # No SSDP answers, so discover_rokus falls back to probing every configured device
+        fleet.ssdp_enabled = False
+        try:
+            return set(choyroku.discover_rokus(timeout=timeout))
+        finally:
+            fleet.ssdp_enabled = True
+
+    def find_rokus_ssdp():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return set(find_rokus.discover_via_ssdp())
+
+    def find_rokus_scan():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return set(find_rokus.scan_ips(fleet.addresses))
+
+    return {
+        "discover_rokus SSDP": choyroku_ssdp,
+        "discover_rokus probe": choyroku_probe,
+        "find_rokus SSDP": find_rokus_ssdp,
+        "find_rokus scan": find_rokus_scan,
+    }
+
+
+def benchmark(args):
+    """Time every discovery method against fleets of each size; returns {size: {method: summary}}"""
+    from benchmark import prepare_app
+    import find_rokus
+
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",")]:
+        fleet = Fleet(args.address, size, latency_ms=args.latency, jitter_ms=args.jitter,
+                      ssdp_delay_ms=args.ssdp_delay, loss=args.loss, churn=args.churn,
+                      churn_interval=args.churn_interval).start()
+        try:
+            # The fleet is the configured device list, which is what the probe fallback walks
+            choyroku = prepare_app(fleet.addresses)
+            logging.disable(logging.CRITICAL)
+            print(f"\n🎯 Discovery at {size} devices")
+            results[size] = {}
+            for name, method in discovery_methods(choyroku, find_rokus, fleet, args.timeout).items():
+                times, found, recall = [], [], []
+                for _ in range(args.runs):
+                    online = fleet.online()
+                    start = time.perf_counter()
+                    seen = method()
+                    times.append(time.perf_counter() - start)
+                    found.append(len(seen))
+                    recall.append(len(seen & online) / len(online) * 100 if online else 100.0)
+                r = results[size][name] = {
+                    "median_s": round(statistics.median(times), 3),
+                    "max_s": round(max(times), 3),
+                    "found_min": min(found),
+                    "found_max": max(found),
+                    "recall_min": round(min(recall), 1),
+                }
+                mark = "✅" if r["recall_min"] >= 100 else "⚠️ "
+                print(f"   {mark} {name:<22} {r['median_s']:7.2f} s median {r['max_s']:7.2f} s max   "
+                      f"found {r['found_min']}-{r['found_max']}   recall ≥ {r['recall_min']:g}%")
+        finally:
+            fleet.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Roku fleet for discovery testing")
+    parser.add_argument("--address", default="127.0.1.1", help="address of the first device (default: 127.0.1.1)")
+    parser.add_argument("--count", type=int, default=10, help="number of devices to serve (default: 10)")
+    parser.add_argument("--latency", type=float, default=0.0, help="ECP response latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ECP latency jitter in +/- ms")
+    parser.add_argument("--ssdp-delay", type=float, default=100.0,
+                        help="devices answer M-SEARCH within this many ms, capped at MX (default: 100)")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of SSDP replies lost (0-1)")
+    parser.add_argument("--churn", type=float, default=0.0,
+                        help="fraction of devices offline in each churn interval (0-1)")
+    parser.add_argument("--churn-interval", type=float, default=5.0, help="seconds between churn rounds")
+    parser.add_argument("--benchmark", action="store_true", help="benchmark discovery instead of serving")
+    parser.add_argument("--sizes", default="10,100,1000", help="fleet sizes to benchmark (default: 10,100,1000)")
+    parser.add_argument("--runs", type=int, default=3, help="runs of each method per size (default: 3)")
+    parser.add_argument("--timeout", type=float, default=1.0,
+                        help="discover_rokus SSDP timeout in seconds (default: 1)")
+    parser.add_argument("--json", action="store_true", help="print benchmark results as JSON")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        results = benchmark(args)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        return
+
+    fleet = Fleet(args.address, args.count, latency_ms=args.latency, jitter_ms=args.jitter,
+                  ssdp_delay_ms=args.ssdp_delay, loss=args.loss, churn=args.churn,
+                  churn_interval=args.churn_interval).start()
+    print(f"📺 {args.count} mock Rokus on {fleet.addresses[0]} - {fleet.addresses[-1]}, SSDP on port {SSDP_PORT}")
+    print(f"SSDP delay ≤{args.ssdp_delay:g} ms, loss {args.loss:.0%}, churn {args.churn:.0%}. Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"   {len(fleet.online())}/{args.count} online, {fleet.searches} searches, "
+                  f"{fleet.replies} replies")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,4 +3,7 @@ cd /home/jeff/ChoyRoku
 # Uncomment the next line if you use a virtual environment
 source venv/bin/activate
 
+# Serve from one async (gevent) worker instead of threaded workers; see README
+# export CHOYROKU_SERVER=async
+
 exec gunicorn --config gunicorn.conf.py ChoyRoku:app
@@ -1,18 +1,39 @@
 #!/usr/bin/env python3
 """
-Connection Test Script
-Tests the complete flow from Flask app to Roku device
+Connection Test and Load Generator
+Tests the complete flow from Flask app to Roku device, or drives the app with many virtual phones to size
+workers and hardware.
+
+  python3 test_connection.py                                          # one pass of the setup checks
+  python3 test_connection.py --url http://192.168.1.50:8000 --roku 192.168.1.4
+  python3 test_connection.py --load --phones 50 --rate 2 --duration 60 --roku 127.0.0.2,127.0.0.3
+  python3 test_connection.py --load --phones 200 --mix send=90,page=10 --json
 """
 
-import requests
+import argparse
 import json
+import random
 import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+FLASK_URL = "http://localhost:8000"
+ROKU_IP = "192.168.1.4"
+
+# What a virtual phone does, and how often relative to the others
+LOAD_MIX = {"send": 80, "page": 10, "launch": 5, "select": 5}
+LOAD_KEYS = ["Up", "Down", "Left", "Right", "Select", "Back"]
+LOAD_APPS = ["12", "837"]
+HISTOGRAM_BUCKETS_MS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
 
 def test_flask_app():
     """Test if Flask app is running and accessible"""
     print("🔍 Testing Flask app...")
     try:
-        resp = requests.get("http://localhost:8000", timeout=5)
+        resp = requests.get(FLASK_URL, timeout=5)
         if resp.status_code == 200:
             print("   ✅ Flask app is running and accessible")
             return True
@@ -27,8 +48,8 @@ def test_roku_discovery():
     """Test Roku device discovery"""
     print("\n🔍 Testing Roku discovery...")
     try:
-        resp = requests.get("http://localhost:8000", timeout=5)
-        if "Circus" in resp.text or "192.168.1.4" in resp.text:
+        resp = requests.get(f"{FLASK_URL}/state", timeout=5)
+        if ROKU_IP in resp.text:
             print("   ✅ Roku device found in Flask app")
             return True
         else:
@@ -42,7 +63,7 @@ def test_roku_connection():
     """Test direct connection to Roku device"""
     print("\n🔍 Testing direct Roku connection...")
     try:
-        resp = requests.get("http://192.168.1.4:8060/query/device-info", timeout=5)
+        resp = requests.get(f"http://{ROKU_IP}:8060/query/device-info", timeout=5)
         if resp.status_code == 200:
             print("   ✅ Direct connection to Roku successful")
             return True
@@ -61,13 +82,13 @@ def test_roku_control():
         session = requests.Session()
         
         # First select the Roku device
-        select_data = {"roku_ip": "192.168.1.4"}
-        resp = session.post("http://localhost:8000/select", data=select_data, timeout=5)
+        select_data = {"roku_ip": ROKU_IP}
+        resp = session.post(f"{FLASK_URL}/select", data=select_data, timeout=5)
         
         if resp.status_code in [200, 302]:  # Both OK and redirect are acceptable
             # Now test sending a command
             key_data = {"key": "Home"}
-            resp = session.post("http://localhost:8000/send", data=key_data, timeout=5)
+            resp = session.post(f"{FLASK_URL}/send", data=key_data, timeout=5)
             
             if resp.status_code == 200:
                 print("   ✅ Roku control through Flask successful")
@@ -82,6 +103,175 @@ def test_roku_control():
         print(f"   ❌ Roku control test failed: {e}")
         return False
 
+class LoadStats:
+    """Latencies, errors and suppressed presses per endpoint, shared by every virtual phone"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.suppressed = Counter()
+
+    def record(self, endpoint, ms, error=None, suppressed=False):
+        with self.lock:
+            if error:
+                self.errors[endpoint][error] += 1
+            else:
+                self.latencies[endpoint].append(ms)
+            if suppressed:
+                self.suppressed[endpoint] += 1
+
+
+def virtual_phone(number, rokus, args, mix, stats, stop_at):
+    """One phone with its own cookie session: open the remote, pick a Roku, then act at args.rate per second"""
+    rng = random.Random(number)
+    http = requests.Session()
+    page_etag = [None]
+    launches = [0]
+
+    def call(endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = http.request(method, f"{args.url}{path}", timeout=args.timeout, **kwargs)
+        except requests.RequestException as e:
+            stats.record(endpoint, 0, error=type(e).__name__)
+            return None
+        ms = (time.perf_counter() - start) * 1000
+        suppressed = False
+        if resp.headers.get("Content-Type", "").startswith("application/json"):
+            body = resp.json() if resp.content else {}
+            suppressed = bool(body.get("suppressed") or body.get("skipped"))
+        stats.record(endpoint, ms, error=str(resp.status_code) if resp.status_code >= 400 else None,
+                     suppressed=suppressed)
+        return resp
+
+    def page():
+        # What opening the remote costs: the shell (revalidated, as a browser would) and then its state
+        headers = {"If-None-Match": page_etag[0]} if page_etag[0] else {}
+        resp = call("/", "GET", "/", headers=headers)
+        if resp is not None and resp.headers.get("ETag"):
+            page_etag[0] = resp.headers["ETag"]
+        call("/state", "GET", "/state")
+
+    def select(roku_ip=None):
+        call("/select", "POST", "/select", data={"roku_ip": roku_ip or rng.choice(rokus)},
+             headers={"Accept": "application/json"})
+
+    def send():
+        call("/send", "POST", "/send", data={"key": rng.choice(LOAD_KEYS)})
+
+    def launch():
+        # Alternate apps so launches are not skipped as already running
+        launches[0] += 1
+        call("/launch", "POST", "/launch", data={"app_id": args.apps[launches[0] % len(args.apps)]})
+
+    actions = {"send": send, "page": page, "launch": launch, "select": select}
+    names, weights = list(mix), list(mix.values())
+
+    time.sleep(args.ramp * number / args.phones)
+    page()
+    select(rokus[number % len(rokus)])
+    next_at = time.monotonic()
+    while True:
+        # Poisson arrivals; a phone that falls behind fires at once rather than skipping actions
+        next_at += rng.expovariate(args.rate)
+        if next_at >= stop_at:
+            break
+        wait = next_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        actions[rng.choices(names, weights)[0]]()
+    http.close()
+
+
+def check_load_targets(url, rokus, timeout, rounds=5):
+    """Names the Rokus the app does not know; /state drops a selection that is not in its device registry.
+
+    Each worker keeps its own registry, so rescan a few times to reach every worker's copy.
+    """
+    unknown = list(rokus)
+    for _ in range(rounds):
+        requests.get(f"{url}/state", params={"refresh": "1"}, timeout=timeout)
+        unknown = [ip for ip in unknown
+                   if requests.get(f"{url}/api/v2/devices/{ip}", timeout=timeout).status_code == 404]
+        if not unknown:
+            break
+    return unknown
+
+
+def histogram(latencies):
+    """Counts per HISTOGRAM_BUCKETS_MS bucket, plus one for anything slower"""
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for ms in latencies:
+        counts[next((i for i, edge in enumerate(HISTOGRAM_BUCKETS_MS) if ms <= edge), -1)] += 1
+    return counts
+
+
+def run_load(args):
+    """Drive the app with args.phones virtual phones for args.duration seconds; returns per-endpoint results"""
+    from benchmark import percentile_summary
+
+    rokus = args.roku.split(",")
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in LOAD_MIX:
+            raise ValueError(f"Unknown action {name!r} in --mix (choose from {', '.join(LOAD_MIX)})")
+        mix[name] = float(weight or 1)
+
+    stats = LoadStats()
+    start = time.monotonic()
+    stop_at = start + args.ramp + args.duration
+    phones = [threading.Thread(target=virtual_phone, args=(n, rokus, args, mix, stats, stop_at), daemon=True)
+              for n in range(args.phones)]
+    for phone in phones:
+        phone.start()
+    for phone in phones:
+        phone.join(timeout=max(0, stop_at - time.monotonic()) + args.timeout + 5)
+    elapsed = time.monotonic() - start
+
+    results = {}
+    for endpoint in sorted(set(stats.latencies) | set(stats.errors)):
+        latencies, errors = stats.latencies[endpoint], stats.errors[endpoint]
+        error_count = sum(errors.values())
+        summary = percentile_summary(latencies, elapsed, error_count)
+        summary["throughput"] = round((len(latencies) + error_count) / elapsed, 1)
+        summary["error_rate"] = round(error_count / (len(latencies) + error_count) * 100, 2)
+        summary["error_kinds"] = dict(errors)
+        summary["suppressed"] = stats.suppressed[endpoint]
+        summary["histogram"] = dict(zip([f"<={b}" for b in HISTOGRAM_BUCKETS_MS] + ["slower"],
+                                        histogram(latencies)))
+        results[endpoint] = summary
+    return results
+
+
+def print_load_results(args, results):
+    print("\n" + "=" * 50)
+    print(f"📋 LOAD RESULTS: {args.phones} phones × {args.rate:g} actions/s for {args.duration:g} s "
+          f"(offered {args.phones * args.rate:g}/s)")
+    print("=" * 50)
+    print(f"{'endpoint':<9} {'requests':>8} {'err %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'req/s':>7}")
+    for endpoint, r in results.items():
+        total = r["runs"] + r["errors"]
+        if r["runs"]:
+            print(f"{endpoint:<9} {total:>8} {r['error_rate']:>6.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} "
+                  f"{r['p99']:>8.1f} {r['max']:>8.1f} {r['throughput']:>7.1f}")
+        else:
+            print(f"{endpoint:<9} {total:>8} {r['error_rate']:>6.1f}   every request failed")
+
+    for endpoint, r in results.items():
+        print(f"\n{endpoint}")
+        if r["errors"]:
+            kinds = ", ".join(f"{kind} ×{n}" for kind, n in Counter(r["error_kinds"]).most_common())
+            print(f"   ❌ errors: {kinds}")
+        if r["suppressed"]:
+            print(f"   ℹ️  {r['suppressed']} answered without reaching the Roku (duplicate or already running)")
+        peak = max(r["histogram"].values()) or 1
+        for bucket, count in r["histogram"].items():
+            label = f"{bucket} ms" if bucket != "slower" else f">{HISTOGRAM_BUCKETS_MS[-1]} ms"
+            print(f"   {label:>10} {'█' * round(count / peak * 40):<40} {count}")
+
 def get_network_info():
     """Get network information for troubleshooting"""
     print("\n🌐 Network Information:")
@@ -94,12 +284,52 @@ def get_network_info():
         local_ip = s.getsockname()[0]
         s.close()
         print(f"Local IP: {local_ip}")
-        print(f"Flask app: http://{local_ip}:8000")
-        print(f"Roku device: 192.168.1.4 (Circus)")
+        print(f"Flask app: {FLASK_URL}")
+        print(f"Roku device: {ROKU_IP}")
     except Exception as e:
         print(f"Could not determine network info: {e}")
 
 def main():
+    global FLASK_URL, ROKU_IP
+    parser = argparse.ArgumentParser(description="Check a ChoyRoku setup, or load-test it with virtual phones")
+    parser.add_argument("--url", default=FLASK_URL, help=f"ChoyRoku address (default: {FLASK_URL})")
+    parser.add_argument("--roku", default=ROKU_IP,
+                        help=f"Roku IP; with --load, a comma-separated list the phones share (default: {ROKU_IP})")
+    parser.add_argument("--load", action="store_true", help="run the load generator instead of the checks")
+    parser.add_argument("--phones", type=int, default=10, help="virtual phones (default: 10)")
+    parser.add_argument("--rate", type=float, default=1.0, help="actions per second per phone (default: 1)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load after ramp-up (default: 30)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which phones join (default: 2)")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in LOAD_MIX.items()),
+                        help="relative weights of send, page, launch and select (default: %(default)s)")
+    parser.add_argument("--apps", default=",".join(LOAD_APPS), help="app ids to launch (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="request timeout in seconds (default: 10)")
+    parser.add_argument("--json", action="store_true", help="print load results as JSON")
+    args = parser.parse_args()
+    FLASK_URL = args.url = args.url.rstrip("/")
+    ROKU_IP = args.roku.split(",")[0]
+    args.apps = args.apps.split(",")
+
+    if args.load:
+        try:
+            unknown = check_load_targets(args.url, args.roku.split(","), args.timeout)
+        except requests.RequestException as e:
+            print(f"❌ ChoyRoku not accessible at {args.url}: {e}")
+            sys.exit(1)
+        if unknown:
+            print(f"❌ ChoyRoku does not know {', '.join(unknown)}. Add them to devices.json or let discovery "
+                  f"find them (roku_fleet.py answers SSDP for its mock Rokus).")
+            sys.exit(1)
+        try:
+            results = run_load(args)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.json:
+            print(json.dumps({"settings": vars(args), "endpoints": results}, indent=2))
+        else:
+            print_load_results(args, results)
+        return
+
     print("🎯 ChoyRoku Connection Test")
     print("=" * 40)
     